@@ -2,15 +2,23 @@
 Anomaly Detection Agent
 Identifies unusual patterns and potential issues in sales data
 """
+import json
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
 import logging
+from datetime import datetime, timezone
+import threading
 
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, sales_values, date_stats
 
 logger = logging.getLogger(__name__)
 
+# Columns copied into each reported anomaly
+ANOMALY_RECORD_COLUMNS = ['feature_date', 'store_id', 'dept_id', 'weekly_sales']
+ANOMALY_CACHE_SIZE = 128
+
 
 class AnomalyDetectionAgent(BaseAgent):
     """
@@ -19,6 +27,10 @@ class AnomalyDetectionAgent(BaseAgent):
     
     def __init__(self):
         super().__init__(name="Anomaly Detection Agent", model_name="gemini-2.5-flash")
+        
+        # LRU cache of (anomaly count, top anomalies) keyed by slice identity + threshold
+        self._anomaly_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def get_system_prompt(self) -> str:
         """Get system prompt for anomaly detection agent"""
@@ -74,22 +86,47 @@ Be precise with numbers and dates. Prioritize actionable insights."""
         """
         logger.info(f"{self.name}: Processing anomaly detection request")
         
-        # Extract context
-        sales_data = context.get('sales_data')
-        anomalies = context.get('anomalies', [])
-        question = context.get('question', 'Analyze the detected anomalies and provide insights.')
-        
-        # Build anomaly context
-        anomaly_context = self._build_anomaly_context(sales_data, anomalies, context)
+        question, anomaly_context = self._prepare_request(context)
         
         # Generate response
         response = self.generate_response(question, anomaly_context)
         
+        return self._build_result(response, context)
+    
+    async def aprocess(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Process anomaly detection request without blocking the event loop
+        
+        Args:
+            context: Same keys as process()
+        
+        Returns:
+            Dict with agent response and metadata
+        """
+        logger.info(f"{self.name}: Processing anomaly detection request (async)")
+        
+        question, anomaly_context = self._prepare_request(context)
+        
+        # Generate response
+        response = await self.generate_response_async(question, anomaly_context)
+        
+        return self._build_result(response, context)
+    
+    def _prepare_request(self, context):
+        """Extract the question and build the anomaly context"""
+        sales_data = context.get('sales_data')
+        anomalies = context.get('anomalies', [])
+        question = context.get('question', 'Analyze the detected anomalies and provide insights.')
+        
+        return question, self._build_anomaly_context(sales_data, anomalies, context)
+    
+    def _build_result(self, response, context):
+        """Package the agent response with metadata"""
         return {
             'agent': self.name,
             'response': response,
-            'timestamp': pd.Timestamp.now(),
-            'anomalies_detected': len(anomalies),
+            'timestamp': datetime.now(timezone.utc),
+            'anomalies_detected': len(context.get('anomalies', [])),
             'context_summary': self._summarize_context(context)
         }
     
@@ -98,16 +135,33 @@ Be precise with numbers and dates. Prioritize actionable insights."""
         analysis = {}
         
         if sales_data is not None and len(sales_data) > 0:
+            # Reuse mean/std from anomaly scoring when available
+            if 'sales_stats' in context:
+                avg_sales, sales_std = context['sales_stats']
+            else:
+                vals = sales_values(sales_data['weekly_sales'])
+                avg_sales = np.nanmean(vals, dtype=np.float64)
+                sales_std = np.nanstd(vals, ddof=1, dtype=np.float64)
+            precomputed = context.get('precomputed') or {}
+            if 'h_dates' in precomputed:
+                first_date, last_date, _ = precomputed['h_dates']
+            else:
+                first_date, last_date, _ = date_stats(sales_data['feature_date'])
+            
             analysis['data_summary'] = {
                 'total_records': len(sales_data),
-                'date_range': f"{sales_data['feature_date'].min()} to {sales_data['feature_date'].max()}",
-                'avg_sales': f"${sales_data['weekly_sales'].mean():,.2f}",
-                'sales_std': f"${sales_data['weekly_sales'].std():,.2f}"
+                'date_range': f"{first_date} to {last_date}",
+                'avg_sales': f"${avg_sales:,.2f}",
+                'sales_std': f"${sales_std:,.2f}"
             }
         
         if anomalies:
             analysis['anomalies_found'] = len(anomalies)
-            analysis['anomaly_details'] = anomalies[:10]  # Top 10 anomalies
+            # Top 10 anomalies, serialized once per context and reused on later
+            # prompt builds (e.g. the batched analysis falling back to per-agent calls)
+            if 'anomaly_details_text' not in context:
+                context['anomaly_details_text'] = json.dumps(anomalies[:10], default=str)
+            analysis['anomaly_details'] = context['anomaly_details_text']
         
         if 'threshold' in context:
             analysis['detection_threshold'] = context['threshold']
@@ -136,34 +190,124 @@ Be precise with numbers and dates. Prioritize actionable insights."""
         """
         logger.info(f"{self.name}: Detecting anomalies with threshold={threshold}")
         
-        # Calculate z-scores
-        sales_data = sales_data.copy()
-        sales_data['z_score'] = np.abs((sales_data['weekly_sales'] - sales_data['weekly_sales'].mean()) / 
-                                       sales_data['weekly_sales'].std())
+        return self.process(self._anomaly_context(sales_data, threshold))
+    
+    async def adetect_anomalies(self, sales_data: pd.DataFrame, threshold: float = 3.0) -> Dict[str, Any]:
+        """
+        Async variant of detect_anomalies()
         
-        # Identify anomalies
-        anomalies_df = sales_data[sales_data['z_score'] > threshold]
+        Args:
+            sales_data: DataFrame with sales data
+            threshold: Number of standard deviations for anomaly detection
         
-        # Convert to list of dicts
-        anomalies = []
-        for _, row in anomalies_df.head(20).iterrows():  # Top 20 anomalies
-            anomalies.append({
-                'date': str(row['feature_date']),
-                'store_id': int(row['store_id']),
-                'dept_id': int(row['dept_id']),
-                'sales': f"${row['weekly_sales']:,.2f}",
-                'z_score': f"{row['z_score']:.2f}",
-                'deviation': f"{(row['z_score'] * sales_data['weekly_sales'].std()):,.2f}"
-            })
+        Returns:
+            Dict with detected anomalies and analysis
+        """
+        logger.info(f"{self.name}: Detecting anomalies with threshold={threshold} (async)")
         
-        question = f"""Analyze these {len(anomalies_df)} detected anomalies. 
+        return await self.aprocess(self._anomaly_context(sales_data, threshold))
+    
+    def _anomaly_context(self, sales_data: pd.DataFrame, threshold: float,
+                         precomputed: Optional[Dict[str, Any]] = None,
+                         scope: Optional[tuple] = None) -> Dict[str, Any]:
+        """
+        Score sales data and build the context for anomaly analysis
+        
+        Args:
+            sales_data: DataFrame with sales data
+            threshold: Number of standard deviations for anomaly detection
+            precomputed: Optional shared stats bundle from the orchestrator
+                (h_mean/h_std/h_dates of the same frame)
+            scope: Optional (store_id, dept_id) the frame was filtered to;
+                with precomputed h_dates it makes the scores cacheable
+        """
+        precomputed = precomputed or {}
+        stats = (precomputed['h_mean'], precomputed['h_std']) if 'h_mean' in precomputed else None
+        slice_key = None
+        if scope is not None and 'h_dates' in precomputed:
+            first_date, last_date, _ = precomputed['h_dates']
+            slice_key = (*scope, first_date, last_date)
+        n_anomalies, anomalies, mu, sd = self._score_anomalies(sales_data, threshold, stats, slice_key)
+        
+        question = f"""Analyze these {n_anomalies} detected anomalies. 
         Identify patterns, assess severity, and provide recommendations for investigation."""
         
-        context = {
+        return {
             'sales_data': sales_data,
             'anomalies': anomalies,
             'threshold': threshold,
+            'sales_stats': (mu, sd),
+            'precomputed': precomputed,
             'question': question
         }
+    
+    def _score_anomalies(self, sales_data: pd.DataFrame, threshold: float, stats=None,
+                         slice_key: Optional[tuple] = None):
+        """
+        Return (total anomaly count, top 20 anomaly dicts, mean, std), reusing
+        cached results when the same data slice is scored again
+        
+        stats, when given, is a precomputed (mean, std) of weekly_sales.
+        slice_key identifies the slice as the caller loaded it, e.g.
+        (store_id, dept_id, first_date, last_date). The cache is only used
+        when it is given: hashing the data itself costs more than scoring it.
+        """
+        key = None
+        if slice_key is not None:
+            key = (*slice_key, len(sales_data), float(threshold))
+            with self._cache_lock:
+                cached = self._anomaly_cache.get(key)
+                if cached is not None:
+                    self._anomaly_cache.move_to_end(key)
+                    logger.info(f"{self.name}: Using cached anomaly statistics")
+                    n_anomalies, anomalies, mu, sd = cached
+                    return n_anomalies, list(anomalies), mu, sd
         
-        return self.process(context)
+        # Calculate z-scores in a single NumPy pass (ddof=1 to match pandas .std())
+        vals = sales_values(sales_data['weekly_sales'])
+        if stats is not None:
+            mu, sd = stats
+        else:
+            mu = np.nanmean(vals, dtype=np.float64) if vals.size else np.nan
+            sd = np.nanstd(vals, ddof=1, dtype=np.float64) if vals.size > 1 else np.nan
+        
+        if np.isfinite(sd) and sd > 0:
+            z = np.abs((vals - mu) / sd)
+            mask_idx = np.flatnonzero(z > threshold)
+        else:
+            z = np.zeros(vals.size)
+            mask_idx = np.empty(0, dtype=np.intp)
+        n_anomalies = mask_idx.size
+        
+        # Top 20 anomalies by z-score: O(N) partition, then sort only the survivors
+        if n_anomalies > 20:
+            mask_idx = mask_idx[np.argpartition(-z[mask_idx], 20)[:20]]
+        mask_idx = mask_idx[np.argsort(-z[mask_idx], kind='stable')]
+        
+        top_z = z[mask_idx]
+        col_idx = [sales_data.columns.get_loc(col) for col in ANOMALY_RECORD_COLUMNS]
+        records = sales_data.iloc[mask_idx, col_idx].to_dict('records')
+        anomalies = [
+            {
+                'date': str(row['feature_date']),
+                'store_id': int(row['store_id']),
+                'dept_id': int(row['dept_id']),
+                'sales': f"${row['weekly_sales']:,.2f}",
+                'z_score': f"{row_z:.2f}",
+                'deviation': f"{(row_z * sd):,.2f}"
+            }
+            for row, row_z in zip(records, top_z)
+        ]
+        
+        if key is not None:
+            with self._cache_lock:
+                self._anomaly_cache[key] = (n_anomalies, anomalies, mu, sd)
+                if len(self._anomaly_cache) > ANOMALY_CACHE_SIZE:
+                    self._anomaly_cache.popitem(last=False)
+        
+        return n_anomalies, list(anomalies), mu, sd
+    
+    def clear_anomaly_cache(self):
+        """Clear cached anomaly statistics"""
+        with self._cache_lock:
+            self._anomaly_cache.clear()
@@ -2,15 +2,83 @@
 Base Agent Class for Multi-Agent AI System
 Provides common functionality for all AI agents
 """
+import asyncio
 import os
+import re
 import logging
+import threading
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional
-import google.generativeai as genai
+import numpy as np
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# google.generativeai pulls in grpc/protobuf (~0.5s); imported on first agent creation
+genai = None
+
+# Shared Gemini clients keyed by (api_key, model_name); all agents reuse one
+# GenerativeModel (and its HTTP session) instead of creating their own.
+# Only the blocking client is used (from worker threads in the async path):
+# the SDK's async client is bound to one event loop, so a process-wide model
+# must never touch generate_content_async
+_MODEL_CACHE: Dict[tuple, "genai.GenerativeModel"] = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+_configured_api_key: Optional[str] = None
+
+# Matches top-level (#) and second-level (##) markdown headings
+_HEADING_RE = re.compile(r'^(#{1,2}) ', re.MULTILINE)
+# Downsized replacements: # -> ###, ## -> ####
+_HEADING_MAP = {'#': '### ', '##': '#### '}
+
+
+def _load_genai():
+    """Import google.generativeai on first use"""
+    global genai
+    if genai is None:
+        import google.generativeai as genai_module
+        genai = genai_module
+    return genai
+
+
+def sales_values(series) -> np.ndarray:
+    """
+    Return a sales column as a float32 array
+    
+    Weekly sales fit comfortably in float32, which halves the memory read by
+    every reduction. Reduce with dtype=np.float64 so totals keep cent accuracy.
+    """
+    return series.to_numpy(dtype=np.float32)
+
+
+def nan_sales_stats(values: np.ndarray):
+    """
+    Return (sum, mean, std (ddof=1), median) of a sales array, ignoring NaNs
+    
+    NaNs are dropped once so every reduction runs on the same compact array.
+    """
+    valid = ~np.isnan(values)
+    observed = values if valid.all() else values[valid]
+    n = observed.size
+    total = observed.sum(dtype=np.float64)
+    mean = total / n if n else np.nan
+    std = np.std(observed, ddof=1, dtype=np.float64) if n > 1 else np.nan
+    median = np.median(observed) if n else np.nan
+    return total, mean, std, median
+
+
+def date_stats(series):
+    """
+    Return (min, max, number of distinct dates) for a date column
+    
+    One hash pass finds the distinct dates; min/max then scan only those
+    (a few dozen weeks) instead of the full column.
+    """
+    import pandas as pd
+    
+    uniques = pd.Index(series.unique()).dropna()
+    return uniques.min(), uniques.max(), len(uniques)
+
 
 class BaseAgent(ABC):
     """
@@ -33,14 +101,42 @@ class BaseAgent(ABC):
         if not api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
+        self.model = self._get_model(api_key, model_name)
+        
+        # Escape '$' so Streamlit markdown doesn't treat amounts as LaTeX;
+        # non-Streamlit consumers can turn this off
+        self.escape_dollars = True
         
         # Agent state
         self.conversation_history = []
         
         logger.info(f"✓ {self.name} initialized with {model_name}")
     
+    @classmethod
+    def _get_model(cls, api_key: str, model_name: str) -> "genai.GenerativeModel":
+        """
+        Return the shared GenerativeModel for model_name, creating it on first use
+        
+        Args:
+            api_key: Gemini API key
+            model_name: Gemini model to use
+        
+        Returns:
+            genai.GenerativeModel shared by all agents using this model
+        """
+        global _configured_api_key
+        
+        genai = _load_genai()
+        with _MODEL_CACHE_LOCK:
+            if _configured_api_key != api_key:
+                genai.configure(api_key=api_key)
+                _configured_api_key = api_key
+            
+            key = (api_key, model_name)
+            if key not in _MODEL_CACHE:
+                _MODEL_CACHE[key] = genai.GenerativeModel(model_name)
+            return _MODEL_CACHE[key]
+    
     @abstractmethod
     def get_system_prompt(self) -> str:
         """
@@ -68,44 +164,72 @@ class BaseAgent(ABC):
         """
         Generate a response using Gemini
         """
-        system_prompt = self.get_system_prompt()
-
-        if context:
-            context_str = self._format_context(context)
-            full_prompt = f"{system_prompt}\n\n{context_str}\n\n{prompt}"
-        else:
-            full_prompt = f"{system_prompt}\n\n{prompt}"
+        full_prompt = self._build_prompt(prompt, context)
 
         try:
             response = self.model.generate_content(full_prompt)
-            text = response.text
-            text = text.replace('$', '\\$')
+            return self._finalize_response(prompt, response.text)
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return f"Error: Unable to generate response - {str(e)}"
+
+    async def generate_response_async(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate a response using Gemini without blocking the event loop
+        
+        The blocking client call runs in a worker thread. generate_content_async
+        is avoided on purpose: the SDK caches its grpc.aio client on the first
+        event loop it sees, and each asyncio.run() closes that loop, so every
+        later analysis in the process would fail with "Event loop is closed".
+        """
+        full_prompt = self._build_prompt(prompt, context)
 
-            # Downsize headings: convert # and ## to ### and ####
-            import re
-            text = re.sub(r'^# ', '### ', text, flags=re.MULTILINE)
-            text = re.sub(r'^## ', '#### ', text, flags=re.MULTILINE)
-            # # Clean up formatting issues
-            # # Fix broken bold markers that Streamlit can't render
-            # import re
-            # # Ensure ** markers have spaces around them properly
-            # text = re.sub(r'\*\*\s+', '** ', text)
-            # text = re.sub(r'\s+\*\*', ' **', text)
-            # # Fix cases where ** runs into dollar amounts or numbers
-            # text = re.sub(r'\$([0-9,]+\.?\d*)\*\*', r'$\1** ', text)
-            # text = re.sub(r'\*\*\$', r'** $', text)
-
-            self.conversation_history.append({
-                'timestamp': datetime.now(),
-                'prompt': prompt,
-                'response': text
-            })
-
-            return text
+        try:
+            response = await asyncio.to_thread(self.model.generate_content, full_prompt)
+            return self._finalize_response(prompt, response.text)
 
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return f"Error: Unable to generate response - {str(e)}"
+
+    def _build_prompt(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Combine system prompt, formatted context and user prompt
+        """
+        system_prompt = self.get_system_prompt()
+
+        if context:
+            context_str = self._format_context(context)
+            return f"{system_prompt}\n\n{context_str}\n\n{prompt}"
+        return f"{system_prompt}\n\n{prompt}"
+
+    def _finalize_response(self, prompt: str, text: str) -> str:
+        """
+        Clean up model output for Streamlit and record it in history
+        """
+        if self.escape_dollars:
+            text = text.replace('$', '\\$')
+
+        # Downsize headings: convert # and ## to ### and #### in a single pass
+        text = _HEADING_RE.sub(lambda m: _HEADING_MAP[m.group(1)], text)
+        # # Clean up formatting issues
+        # # Fix broken bold markers that Streamlit can't render
+        # import re
+        # # Ensure ** markers have spaces around them properly
+        # text = re.sub(r'\*\*\s+', '** ', text)
+        # text = re.sub(r'\s+\*\*', ' **', text)
+        # # Fix cases where ** runs into dollar amounts or numbers
+        # text = re.sub(r'\$([0-9,]+\.?\d*)\*\*', r'$\1** ', text)
+        # text = re.sub(r'\*\*\$', r'** $', text)
+
+        self.conversation_history.append({
+            'timestamp': datetime.now(),
+            'prompt': prompt,
+            'response': text
+        })
+
+        return text
             
     def _format_context(self, context: Dict[str, Any]) -> str:
         """
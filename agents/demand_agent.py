@@ -6,8 +6,9 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any
 import logging
+from datetime import datetime, timezone
 
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, sales_values, date_stats, nan_sales_stats
 
 logger = logging.getLogger(__name__)
 
@@ -59,63 +60,117 @@ Format your responses in a professional, concise manner suitable for retail mana
         """
         logger.info(f"{self.name}: Processing demand forecasting request")
 
+        question, analysis_context = self._prepare_request(context)
+        response = self.generate_response(question, analysis_context)
+
+        return self._build_result(response, context)
+
+    async def aprocess(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Process demand forecasting request without blocking the event loop
+        """
+        logger.info(f"{self.name}: Processing demand forecasting request (async)")
+
+        question, analysis_context = self._prepare_request(context)
+        response = await self.generate_response_async(question, analysis_context)
+
+        return self._build_result(response, context)
+
+    def _prepare_request(self, context):
+        """Extract the question and build the analysis context"""
         forecasts = context.get('forecasts')
         historical_sales = context.get('historical_sales')
         question = context.get('question', 'Analyze the demand forecast and provide insights.')
 
-        analysis_context = self._build_analysis_context(forecasts, historical_sales, context)
-
-        response = self.generate_response(question, analysis_context)
+        return question, self._build_analysis_context(forecasts, historical_sales, context)
 
+    def _build_result(self, response, context):
+        """Package the agent response with metadata"""
         return {
             'agent': self.name,
             'response': response,
-            'timestamp': pd.Timestamp.now(),
+            'timestamp': datetime.now(timezone.utc),
             'context_summary': self._summarize_context(context)
         }
 
     def _build_analysis_context(self, forecasts, historical_sales, context):
         """Build context for analysis — clearly separates forecast vs historical"""
         analysis = {}
+        # Reductions shared with the other agents, computed once by the orchestrator
+        precomputed = context.get('precomputed') or {}
 
         # ============================================================
         # FIX: Use forecast_date (future) not feature_date (historical)
         # and clearly label everything as WEEKLY
         # ============================================================
         if forecasts is not None and len(forecasts) > 0:
+            # float32 values, float64 accumulators (see sales_values)
+            predicted = sales_values(forecasts['predicted_sales'])
+            # factorize() reads integer codes directly when ids are categorical
+            store_codes, stores = pd.factorize(forecasts['store_id'], sort=True)
+            dept_codes, depts = pd.factorize(forecasts['dept_id'])
+            pair_codes = store_codes * len(depts) + dept_codes
+            pair_codes = pair_codes[(store_codes >= 0) & (dept_codes >= 0)]
+            if 'f_sum' in precomputed:
+                total_predicted, avg_predicted = precomputed['f_sum'], precomputed['f_mean']
+                first_week, last_week, n_weeks = precomputed['f_dates']
+            else:
+                total_predicted = predicted.sum(dtype=np.float64)
+                avg_predicted = total_predicted / predicted.size
+                first_week, last_week, n_weeks = date_stats(forecasts['forecast_date'])
             analysis['forecast_summary'] = {
                 'data_granularity': 'WEEKLY (each value = one full week of sales)',
-                'total_predicted_weekly_sales': f"${forecasts['predicted_sales'].sum():,.2f}",
-                'avg_predicted_weekly_sales': f"${forecasts['predicted_sales'].mean():,.2f}",
-                'min_predicted_weekly_sales': f"${forecasts['predicted_sales'].min():,.2f}",
-                'max_predicted_weekly_sales': f"${forecasts['predicted_sales'].max():,.2f}",
-                'forecast_period': f"{forecasts['forecast_date'].min()} to {forecasts['forecast_date'].max()}",
-                'num_weeks_forecasted': forecasts['forecast_date'].nunique(),
-                'num_store_dept_combinations': len(forecasts.groupby(['store_id', 'dept_id'])),
+                'total_predicted_weekly_sales': f"${total_predicted:,.2f}",
+                'avg_predicted_weekly_sales': f"${avg_predicted:,.2f}",
+                'min_predicted_weekly_sales': f"${predicted.min():,.2f}",
+                'max_predicted_weekly_sales': f"${predicted.max():,.2f}",
+                'forecast_period': f"{first_week} to {last_week}",
+                'num_weeks_forecasted': n_weeks,
+                'num_store_dept_combinations': int(np.count_nonzero(np.bincount(pair_codes))),
             }
 
-            # Add per-store breakdown if multiple stores
-            if forecasts['store_id'].nunique() <= 10:
-                store_summary = forecasts.groupby('store_id')['predicted_sales'].agg(['mean', 'sum']).round(2)
-                analysis['forecast_by_store'] = store_summary.to_dict()
+            # Add per-store breakdown if multiple stores (bincount over the same array)
+            if len(stores) <= 10:
+                valid = store_codes >= 0
+                store_sums = np.bincount(store_codes[valid], weights=predicted[valid],
+                                         minlength=len(stores))
+                store_counts = np.bincount(store_codes[valid], minlength=len(stores))
+                store_means = store_sums / np.maximum(store_counts, 1)
+                store_keys = stores.tolist()
+                analysis['forecast_by_store'] = {
+                    'mean': dict(zip(store_keys, np.round(store_means, 2).tolist())),
+                    'sum': dict(zip(store_keys, np.round(store_sums, 2).tolist())),
+                }
 
         if historical_sales is not None and len(historical_sales) > 0:
+            # weekly_sales is nullable in engineered_features, so use NaN-aware reductions
+            hist = sales_values(historical_sales['weekly_sales'])
+            if 'h_sum' in precomputed:
+                total_hist, mean_hist, std_hist, median_hist = (
+                    precomputed[k] for k in ('h_sum', 'h_mean', 'h_std', 'h_median'))
+            else:
+                total_hist, mean_hist, std_hist, median_hist = nan_sales_stats(hist)
+            # Sorted week codes give both the date range and the trend buckets
+            week_codes, weeks = pd.factorize(historical_sales['feature_date'], sort=True)
             analysis['historical_summary'] = {
                 'data_granularity': 'WEEKLY (each value = one full week of sales)',
-                'avg_weekly_sales': f"${historical_sales['weekly_sales'].mean():,.2f}",
-                'median_weekly_sales': f"${historical_sales['weekly_sales'].median():,.2f}",
-                'std_weekly_sales': f"${historical_sales['weekly_sales'].std():,.2f}",
-                'total_historical_sales': f"${historical_sales['weekly_sales'].sum():,.2f}",
-                'historical_date_range': f"{historical_sales['feature_date'].min()} to {historical_sales['feature_date'].max()}",
-                'num_historical_weeks': historical_sales['feature_date'].nunique(),
+                'avg_weekly_sales': f"${mean_hist:,.2f}",
+                'median_weekly_sales': f"${median_hist:,.2f}",
+                'std_weekly_sales': f"${std_hist:,.2f}",
+                'total_historical_sales': f"${total_hist:,.2f}",
+                'historical_date_range': f"{weeks.min()} to {weeks.max()}",
+                'num_historical_weeks': len(weeks),
             }
 
             # Trend: compare recent 8 weeks vs prior 8 weeks
-            sorted_hist = historical_sales.sort_values('feature_date', ascending=False)
-            dates = sorted_hist['feature_date'].unique()
-            if len(dates) >= 16:
-                recent_avg = sorted_hist[sorted_hist['feature_date'].isin(dates[:8])]['weekly_sales'].mean()
-                prior_avg = sorted_hist[sorted_hist['feature_date'].isin(dates[8:16])]['weekly_sales'].mean()
+            # (per-week sums/counts keep the row-level average of the original filter)
+            week_valid = ~np.isnan(hist) & (week_codes >= 0)
+            week_sums = np.bincount(week_codes[week_valid], weights=hist[week_valid],
+                                    minlength=len(weeks))
+            week_counts = np.bincount(week_codes[week_valid], minlength=len(weeks))
+            if len(weeks) >= 16:
+                recent_avg = week_sums[-8:].sum() / week_counts[-8:].sum()
+                prior_avg = week_sums[-16:-8].sum() / week_counts[-16:-8].sum()
                 trend_pct = ((recent_avg - prior_avg) / prior_avg) * 100
                 analysis['recent_trend'] = {
                     'recent_8wk_avg': f"${recent_avg:,.2f}",
@@ -146,8 +201,11 @@ Format your responses in a professional, concise manner suitable for retail mana
         Provide specific recommendations to improve forecast accuracy."""
 
         merged = actual.merge(predicted, on=['store_id', 'dept_id', 'feature_date'], how='inner')
-        mae = np.abs(merged['weekly_sales'] - merged['predicted_sales']).mean()
-        mape = (np.abs(merged['weekly_sales'] - merged['predicted_sales']) / merged['weekly_sales']).mean() * 100
+        actual_vals = merged['weekly_sales'].to_numpy(dtype=float)
+        abs_err = np.abs(actual_vals - merged['predicted_sales'].to_numpy(dtype=float))
+        mae = abs_err.mean()
+        np.divide(abs_err, actual_vals, out=abs_err)  # reuse the buffer for percentage errors
+        mape = abs_err.mean() * 100
 
         context = {
             'actual_sales': actual,
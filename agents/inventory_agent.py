@@ -6,8 +6,9 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any
 import logging
+from datetime import datetime, timezone
 
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, sales_values, date_stats
 
 logger = logging.getLogger(__name__)
 
@@ -59,17 +60,33 @@ Format your responses with clear sections for easy implementation."""
         """Process inventory optimization request"""
         logger.info(f"{self.name}: Processing inventory optimization request")
 
+        question, opt_context = self._prepare_request(context)
+        response = self.generate_response(question, opt_context)
+
+        return self._build_result(response, context)
+
+    async def aprocess(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Process inventory optimization request without blocking the event loop"""
+        logger.info(f"{self.name}: Processing inventory optimization request (async)")
+
+        question, opt_context = self._prepare_request(context)
+        response = await self.generate_response_async(question, opt_context)
+
+        return self._build_result(response, context)
+
+    def _prepare_request(self, context):
+        """Extract the question and build the optimization context"""
         forecasts = context.get('forecasts')
         question = context.get('question', 'Provide inventory optimization recommendations based on the forecast.')
 
-        opt_context = self._build_optimization_context(forecasts, context)
-
-        response = self.generate_response(question, opt_context)
+        return question, self._build_optimization_context(forecasts, context)
 
+    def _build_result(self, response, context):
+        """Package the agent response with metadata"""
         return {
             'agent': self.name,
             'response': response,
-            'timestamp': pd.Timestamp.now(),
+            'timestamp': datetime.now(timezone.utc),
             'context_summary': self._summarize_context(context)
         }
 
@@ -78,15 +95,21 @@ Format your responses with clear sections for easy implementation."""
         analysis = {}
 
         if forecasts is not None and len(forecasts) > 0:
-            weekly_demand = forecasts.groupby('store_id')['predicted_sales'].agg(['mean', 'std', 'sum'])
+            store_mean, store_std, total_demand = self._store_demand_stats(forecasts)
+            # Reuse the orchestrator's shared forecast date range when available
+            precomputed = context.get('precomputed') or {}
+            if 'f_dates' in precomputed:
+                first_week, last_week, n_weeks = precomputed['f_dates']
+            else:
+                first_week, last_week, n_weeks = date_stats(forecasts['forecast_date'])
 
             analysis['demand_analysis'] = {
                 'data_granularity': 'WEEKLY (each predicted_sales value = 7 days of sales)',
-                'avg_weekly_demand': f"${weekly_demand['mean'].mean():,.2f}",
-                'demand_variability_std': f"${weekly_demand['std'].mean():,.2f}",
-                'total_forecasted_demand': f"${weekly_demand['sum'].sum():,.2f}",
-                'forecast_weeks': forecasts['forecast_date'].nunique(),
-                'forecast_period': f"{forecasts['forecast_date'].min()} to {forecasts['forecast_date'].max()}",
+                'avg_weekly_demand': f"${np.nanmean(store_mean):,.2f}",
+                'demand_variability_std': f"${np.nanmean(store_std):,.2f}",
+                'total_forecasted_demand': f"${total_demand:,.2f}",
+                'forecast_weeks': n_weeks,
+                'forecast_period': f"{first_week} to {last_week}",
                 'num_stores': forecasts['store_id'].nunique(),
                 'num_departments': forecasts['dept_id'].nunique(),
             }
@@ -100,6 +123,27 @@ Format your responses with clear sections for easy implementation."""
 
         return analysis
 
+    @staticmethod
+    def _store_demand_stats(forecasts):
+        """
+        Per-store mean and std (ddof=1) of predicted sales plus the grand total,
+        computed with NumPy bincount reductions instead of a sorted groupby
+        """
+        codes, uniques = pd.factorize(forecasts['store_id'], sort=False)
+        vals = sales_values(forecasts['predicted_sales'])
+        n_stores = len(uniques)
+
+        counts = np.bincount(codes, minlength=n_stores)
+        sums = np.bincount(codes, weights=vals, minlength=n_stores)
+        store_mean = sums / counts
+
+        sq_dev = np.bincount(codes, weights=(vals - store_mean[codes]) ** 2, minlength=n_stores)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            store_std = np.sqrt(sq_dev / (counts - 1))
+        store_std[counts < 2] = np.nan
+
+        return store_mean, store_std, sums.sum()
+
     def _summarize_context(self, context):
         """Create a summary of the context"""
         summary = []
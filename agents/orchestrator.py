@@ -2,94 +2,350 @@
 Multi-Agent Orchestrator
 Coordinates multiple AI agents to provide comprehensive insights
 """
+import asyncio
+import json
+import re
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncGenerator, Iterator
 import logging
+from datetime import datetime, timezone
 
+from agents.base_agent import sales_values, date_stats, nan_sales_stats
 from agents.demand_agent import DemandForecastingAgent
 from agents.inventory_agent import InventoryOptimizationAgent
 from agents.anomaly_agent import AnomalyDetectionAgent
 
 logger = logging.getLogger(__name__)
 
+# Agent key -> results key, in the order sections appear in batched prompts
+RESULT_KEYS = {
+    'demand': 'demand_analysis',
+    'inventory': 'inventory_recommendations',
+    'anomaly': 'anomaly_detection'
+}
+
+BATCH_INSTRUCTIONS = """You are acting as three specialist agents at once. Each section below
+(### DEMAND, ### INVENTORY, ### ANOMALY) contains one agent's instructions, context and question.
+Answer every section independently, following that section's instructions.
+
+Return ONLY a JSON object with exactly the keys "demand", "inventory" and "anomaly".
+Each value must be that agent's full markdown response as a string."""
+
 
 class AgentOrchestrator:
     """
     Orchestrates multiple AI agents to provide comprehensive analysis
     """
     
-    def __init__(self):
-        """Initialize orchestrator with all agents"""
+    def __init__(self, escape_dollars: bool = True):
+        """
+        Initialize orchestrator with all agents
+        
+        Args:
+            escape_dollars: Escape '$' in responses for Streamlit markdown.
+                Disable for plain-text consumers such as the CLI scripts.
+        """
         self.agents = {
             'demand': DemandForecastingAgent(),
             'inventory': InventoryOptimizationAgent(),
             'anomaly': AnomalyDetectionAgent()
         }
+        for agent in self.agents.values():
+            agent.escape_dollars = escape_dollars
         
         logger.info("✓ AgentOrchestrator initialized with 3 agents")
     
     def analyze_forecast(self, forecasts: pd.DataFrame, historical_sales: pd.DataFrame,
-                        store_id: Optional[int] = None, dept_id: Optional[int] = None) -> Dict[str, Any]:
+                        store_id: Optional[int] = None, dept_id: Optional[int] = None,
+                        batched: bool = False) -> Dict[str, Any]:
         """
         Comprehensive forecast analysis using multiple agents
         
+        The three agents are independent, so they are run concurrently and
+        total latency is bounded by the slowest agent rather than the sum.
+        With batched=True all three are answered by a single Gemini call.
+        
         Args:
             forecasts: DataFrame with predictions
             historical_sales: DataFrame with historical data
             store_id: Optional store filter
             dept_id: Optional department filter
+            batched: Combine the three agent prompts into one API call
         
         Returns:
             Dict with insights from all agents
         """
+        if batched:
+            return self._batched_analyze(forecasts, historical_sales, store_id, dept_id)
+        
         logger.info("AgentOrchestrator: Running comprehensive forecast analysis")
         
-        # Filter data if needed
-        if store_id:
-            forecasts = forecasts[forecasts['store_id'] == store_id]
-            historical_sales = historical_sales[historical_sales['store_id'] == store_id]
-        if dept_id:
-            forecasts = forecasts[forecasts['dept_id'] == dept_id]
-            historical_sales = historical_sales[historical_sales['dept_id'] == dept_id]
+        contexts = self._build_agent_contexts(forecasts, historical_sales, store_id, dept_id)
+        results = self._run_agents(contexts)
         
-        results = {}
+        logger.info("✓ Comprehensive analysis complete")
         
-        # 1. Demand Forecasting Analysis
-        logger.info("  Running Demand Forecasting Agent...")
-        demand_context = {
-            'forecasts': forecasts,
-            'historical_sales': historical_sales,
-            'store_id': store_id,
-            'dept_id': dept_id,
-            'question': 'Analyze the sales forecast and provide insights on demand trends, patterns, and recommendations.'
-        }
-        results['demand_analysis'] = self.agents['demand'].process(demand_context)
-        
-        # 2. Inventory Optimization
-        logger.info("  Running Inventory Optimization Agent...")
-        inventory_context = {
-            'forecasts': forecasts,
-            'service_level': 0.95,
-            'lead_time_days': 7,
-            'store_id': store_id,
-            'dept_id': dept_id,
-            'question': 'Provide inventory optimization recommendations based on the forecast.'
+        return self._package_results(results)
+    
+    async def analyze_forecast_stream(self, forecasts: pd.DataFrame, historical_sales: pd.DataFrame,
+                                      store_id: Optional[int] = None,
+                                      dept_id: Optional[int] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Run the agents concurrently and yield partial results as each finishes
+        
+        Every yielded dict has the same shape as analyze_forecast(), with
+        detailed_insights containing only the agents completed so far, so
+        callers can render the first insight as soon as it arrives.
+        
+        Args:
+            forecasts: DataFrame with predictions
+            historical_sales: DataFrame with historical data
+            store_id: Optional store filter
+            dept_id: Optional department filter
+        
+        Yields:
+            Dict with insights from the agents completed so far
+        """
+        logger.info("AgentOrchestrator: Streaming comprehensive forecast analysis")
+        
+        contexts = self._build_agent_contexts(forecasts, historical_sales, store_id, dept_id)
+        tasks = {
+            asyncio.create_task(self.agents[key].aprocess(contexts[key])): result_key
+            for key, result_key in RESULT_KEYS.items()
         }
-        results['inventory_recommendations'] = self.agents['inventory'].process(inventory_context)
         
-        # 3. Anomaly Detection
-        logger.info("  Running Anomaly Detection Agent...")
-        anomaly_result = self.agents['anomaly'].detect_anomalies(historical_sales, threshold=3.0)
-        results['anomaly_detection'] = anomaly_result
+        results = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[tasks[task]] = task.result()
+                yield self._package_results(results)
+        finally:
+            for task in pending:
+                task.cancel()
         
         logger.info("✓ Comprehensive analysis complete")
+    
+    def iter_analyze_forecast(self, forecasts: pd.DataFrame, historical_sales: pd.DataFrame,
+                              store_id: Optional[int] = None,
+                              dept_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Synchronous wrapper around analyze_forecast_stream() for Streamlit
+        
+        Each call drives the stream on its own short-lived loop, the same as
+        analyze_forecast(). That is safe to mix with other analyses because the
+        agents call Gemini from worker threads, with no client bound to a loop.
+        
+        Yields:
+            Dict with insights from the agents completed so far
+        """
+        loop = asyncio.new_event_loop()
+        stream = self.analyze_forecast_stream(forecasts, historical_sales, store_id, dept_id)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(stream.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(stream.aclose())
+            # Join the to_thread workers like asyncio.run() does
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+    
+    def _batched_analyze(self, forecasts: pd.DataFrame, historical_sales: pd.DataFrame,
+                         store_id: Optional[int] = None, dept_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Answer all three agents with one Gemini request
+        
+        Each agent's system prompt, context and question become a ### section
+        of one prompt; the model returns a JSON object with one response per
+        agent. Falls back to concurrent per-agent calls if the response can't
+        be parsed.
+        
+        Args:
+            forecasts: DataFrame with predictions
+            historical_sales: DataFrame with historical data
+            store_id: Optional store filter
+            dept_id: Optional department filter
+        
+        Returns:
+            Dict with insights from all agents
+        """
+        logger.info("AgentOrchestrator: Running batched forecast analysis (1 API call)")
+        
+        contexts = self._build_agent_contexts(forecasts, historical_sales, store_id, dept_id)
+        
+        questions = {}
+        sections = []
+        for key in RESULT_KEYS:
+            agent = self.agents[key]
+            question, agent_context = agent._prepare_request(contexts[key])
+            questions[key] = question
+            sections.append(f"### {key.upper()}\n{agent._build_prompt(question, agent_context)}")
+        full_prompt = BATCH_INSTRUCTIONS + "\n\n" + "\n\n".join(sections)
+        
+        try:
+            response = self.agents['demand'].model.generate_content(full_prompt)
+            responses = self._parse_batched_response(response.text)
+        except Exception as e:
+            logger.warning(f"Batched analysis failed ({e}); falling back to per-agent calls")
+            results = self._run_agents(contexts)
+            return self._package_results(results)
+        
+        results = {}
+        for key, result_key in RESULT_KEYS.items():
+            agent = self.agents[key]
+            text = agent._finalize_response(questions[key], responses[key])
+            results[result_key] = agent._build_result(text, contexts[key])
+        
+        logger.info("✓ Batched analysis complete")
+        
+        return self._package_results(results)
+    
+    def _build_agent_contexts(self, forecasts: pd.DataFrame, historical_sales: pd.DataFrame,
+                              store_id: Optional[int], dept_id: Optional[int]) -> Dict[str, Dict[str, Any]]:
+        """
+        Filter the data to the requested scope and build each agent's context
+        
+        Returns:
+            Dict mapping agent key to its process() context
+        """
+        # Filter data if needed (one combined mask -> one copy per frame)
+        forecasts = self._filter_scope(forecasts, store_id, dept_id)
+        historical_sales = self._filter_scope(historical_sales, store_id, dept_id)
+        precomputed = self._precompute_stats(forecasts, historical_sales)
         
+        return {
+            # 1. Demand Forecasting Analysis
+            'demand': {
+                'forecasts': forecasts,
+                'historical_sales': historical_sales,
+                'store_id': store_id,
+                'dept_id': dept_id,
+                'precomputed': precomputed,
+                'question': 'Analyze the sales forecast and provide insights on demand trends, patterns, and recommendations.'
+            },
+            # 2. Inventory Optimization
+            'inventory': {
+                'forecasts': forecasts,
+                'service_level': 0.95,
+                'lead_time_days': 7,
+                'store_id': store_id,
+                'dept_id': dept_id,
+                'precomputed': precomputed,
+                'question': 'Provide inventory optimization recommendations based on the forecast.'
+            },
+            # 3. Anomaly Detection
+            'anomaly': self.agents['anomaly']._anomaly_context(historical_sales, threshold=3.0,
+                                                               precomputed=precomputed,
+                                                               scope=(store_id, dept_id))
+        }
+    
+    @staticmethod
+    def _precompute_stats(forecasts: pd.DataFrame, historical_sales: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Compute the column reductions several agents need, once per analysis
+        
+        Args:
+            forecasts: Scoped forecast DataFrame
+            historical_sales: Scoped historical DataFrame
+        
+        Returns:
+            Dict with f_sum/f_mean/f_dates for forecasts and
+            h_sum/h_mean/h_std/h_median/h_dates for historical sales
+            (keys are omitted for empty frames)
+        """
+        stats = {}
+        if forecasts is not None and len(forecasts) > 0:
+            predicted = sales_values(forecasts['predicted_sales'])
+            stats['f_sum'] = predicted.sum(dtype=np.float64)
+            stats['f_mean'] = stats['f_sum'] / predicted.size
+            stats['f_dates'] = date_stats(forecasts['forecast_date'])
+        if historical_sales is not None and len(historical_sales) > 0:
+            hist = sales_values(historical_sales['weekly_sales'])
+            stats['h_sum'], stats['h_mean'], stats['h_std'], stats['h_median'] = nan_sales_stats(hist)
+            stats['h_dates'] = date_stats(historical_sales['feature_date'])
+        return stats
+    
+    def _run_agents(self, contexts: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run every agent concurrently from synchronous code
+        
+        Shared by analyze_forecast() and the batched fallback. Each call gets a
+        fresh loop; the agents call Gemini from worker threads, so nothing
+        outlives it.
+        """
+        return asyncio.run(self._run_agents_async(contexts))
+    
+    async def _run_agents_async(self, contexts: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Run every agent's aprocess() concurrently and key results by section"""
+        logger.info("  Running Demand, Inventory and Anomaly agents concurrently...")
+        responses = await asyncio.gather(*(
+            self.agents[key].aprocess(contexts[key]) for key in RESULT_KEYS
+        ))
+        return dict(zip(RESULT_KEYS.values(), responses))
+    
+    def _package_results(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Wrap agent results with the summary and timestamp"""
         return {
             'summary': self._create_summary(results),
             'detailed_insights': results,
-            'timestamp': pd.Timestamp.now()
+            'timestamp': datetime.now(timezone.utc)
         }
     
+    @staticmethod
+    def _parse_batched_response(text: str) -> Dict[str, str]:
+        """
+        Parse the JSON object returned by a batched prompt
+        
+        Args:
+            text: Raw model output, optionally wrapped in a ```json fence
+        
+        Returns:
+            Dict with 'demand', 'inventory' and 'anomaly' responses
+        """
+        text = re.sub(r'^\s*```(?:json)?\s*|\s*```\s*$', '', text)
+        data = json.loads(text)
+        missing = [key for key in RESULT_KEYS if not isinstance(data.get(key), str)]
+        if missing:
+            raise ValueError(f"Batched response missing sections: {missing}")
+        return {key: data[key] for key in RESULT_KEYS}
+    
+    @staticmethod
+    def _filter_scope(df: pd.DataFrame, store_id: Optional[int], dept_id: Optional[int]) -> pd.DataFrame:
+        """
+        Restrict a frame to the requested store/department
+        
+        Args:
+            df: DataFrame with store_id and dept_id columns
+            store_id: Optional store filter
+            dept_id: Optional department filter
+        
+        Returns:
+            Filtered DataFrame (the input itself when no filter applies)
+        """
+        mask = None
+        if store_id:
+            mask = AgentOrchestrator._id_mask(df['store_id'], store_id)
+        if dept_id:
+            dept_mask = AgentOrchestrator._id_mask(df['dept_id'], dept_id)
+            mask = dept_mask if mask is None else mask & dept_mask
+        return df if mask is None else df[mask]
+    
+    @staticmethod
+    def _id_mask(col: pd.Series, value) -> np.ndarray:
+        """Equality mask for an id column; categoricals compare integer codes"""
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            categories = col.cat.categories
+            if value not in categories:
+                return np.zeros(len(col), dtype=bool)
+            return col.cat.codes.to_numpy() == categories.get_loc(value)
+        return col.to_numpy() == value
+    
     def ask_agent(self, agent_name: str, question: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         Ask a specific agent a question
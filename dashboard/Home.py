@@ -51,6 +51,20 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+
+@st.cache_data(ttl=600)
+def load_quick_stats():
+    """Store count, department count and latest data date in one query"""
+    import pandas as pd
+    from dashboard._db import get_engine
+    return pd.read_sql("""
+        SELECT
+            (SELECT COUNT(DISTINCT store_id) FROM stores) AS stores,
+            (SELECT COUNT(DISTINCT dept_id) FROM raw_sales) AS depts,
+            (SELECT MAX(feature_date) FROM engineered_features) AS latest
+    """, get_engine()).iloc[0]
+
+
 # Sidebar
 with st.sidebar:
     st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/c/ca/Walmart_logo.svg/200px-Walmart_logo.svg.png", width=150)
@@ -72,24 +86,10 @@ with st.sidebar:
     
     # Load quick stats
     try:
-        from database.db_manager import db_manager
-        import pandas as pd
-        
-        engine = db_manager.connect()
-        
-        # Get store count
-        stores = pd.read_sql("SELECT COUNT(DISTINCT store_id) as count FROM stores", engine)
-        st.metric("Total Stores", f"{stores['count'].iloc[0]}")
-        
-        # Get department count
-        depts = pd.read_sql("SELECT COUNT(DISTINCT dept_id) as count FROM raw_sales", engine)
-        st.metric("Departments", f"{depts['count'].iloc[0]}")
-        
-        # Get latest data date
-        latest = pd.read_sql("SELECT MAX(feature_date) as date FROM engineered_features", engine)
-        st.metric("Latest Data", latest['date'].iloc[0].strftime('%Y-%m-%d'))
-        
-        db_manager.close()
+        stats = load_quick_stats()
+        st.metric("Total Stores", f"{stats['stores']}")
+        st.metric("Departments", f"{stats['depts']}")
+        st.metric("Latest Data", stats['latest'].strftime('%Y-%m-%d'))
     except Exception as e:
         st.warning("Unable to load stats")
 
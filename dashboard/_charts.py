@@ -0,0 +1,86 @@
+"""
+Chart helpers shared by dashboard pages
+"""
+import numpy as np
+import pandas as pd
+
+# Points per line trace sent to the browser; plotly.js hover/redraw cost grows
+# with every point, and nothing beyond pixel resolution is visible anyway
+MAX_LINE_POINTS = 2000
+
+try:
+    # Optional: compiled LTTB from plotly-resampler (tsdownsample backend)
+    from plotly_resampler.aggregation import LTTB
+except ImportError:
+    LTTB = None
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets point selection
+
+    Keeps the first and last points and, from each of n_out - 2 equal-width
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket.
+
+    Args:
+        x: Sorted numeric x values
+        y: y values
+        n_out: Number of points to keep
+
+    Returns:
+        Sorted index positions of the kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+
+    out = np.empty(n_out, dtype=np.intp)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def downsample(df: pd.DataFrame, x_col: str, y_col: str,
+               n_out: int = MAX_LINE_POINTS) -> pd.DataFrame:
+    """
+    Reduce a line series to at most n_out visually representative rows
+
+    Args:
+        df: DataFrame sorted by x_col
+        x_col: x column (numeric or datetime)
+        y_col: y column
+        n_out: Maximum number of rows to return
+
+    Returns:
+        df itself when already small enough, else the LTTB-selected rows
+    """
+    if len(df) <= n_out:
+        return df
+
+    x = df[x_col].to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').view(np.int64)
+    x = x.astype(np.float64, copy=False)
+    y = df[y_col].to_numpy(dtype=np.float64)
+
+    if LTTB is not None:
+        idx = LTTB().arg_downsample(x, y, n_out=n_out)
+    else:
+        idx = lttb_indices(x, y, n_out)
+    return df.iloc[idx]
@@ -0,0 +1,10 @@
+"""
+Streamlit version compatibility helpers
+"""
+import streamlit as st
+
+# Partial reruns: st.fragment (>=1.37) or st.experimental_fragment (>=1.33).
+# On older Streamlit the decorator is a no-op and the whole script reruns as before.
+fragment = (getattr(st, 'fragment', None)
+            or getattr(st, 'experimental_fragment', None)
+            or (lambda func: func))
@@ -0,0 +1,132 @@
+"""
+CSV serialization shared by dashboard downloads
+"""
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    # Optional: pyarrow's C++ CSV writer joins and writes rows several times
+    # faster than pandas
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Characters that make DataFrame.to_csv (QUOTE_MINIMAL) quote a field
+_NEEDS_QUOTING = r'[",\r\n]'
+
+
+def _numpy_backed(series: pd.Series) -> pd.Series:
+    """
+    NumPy-backed equivalent of an Arrow-backed or string column, when lossless
+
+    DATE columns read by _db.read_frame arrive as Arrow timestamps; as
+    datetime64 they are written as plain YYYY-MM-DD dates like the NumPy
+    backend's. Integer/bool columns with nulls are left as they are.
+    """
+    dtype = series.dtype
+    is_string = isinstance(dtype, pd.StringDtype) or (
+        isinstance(dtype, pd.ArrowDtype) and dtype.numpy_dtype.kind == 'U')
+    if is_string:
+        return pd.Series(series.to_numpy(dtype=object, na_value=None), index=series.index,
+                         name=series.name, dtype=object)
+    if not isinstance(dtype, pd.ArrowDtype):
+        return series
+    numpy_dtype = dtype.numpy_dtype
+    if numpy_dtype.kind in 'iub' and series.hasnans:
+        return series
+    if numpy_dtype.kind == 'M':
+        return series.astype('datetime64[ns]')
+    if numpy_dtype.kind in 'iufb':
+        return series.astype(numpy_dtype)
+    return series
+
+def _arrow_column(series: pd.Series):
+    """
+    Arrow array that the CSV writer renders exactly as DataFrame.to_csv does
+
+    Returns:
+        pyarrow Array, or None when the column needs pandas' own formatting
+        (quoted strings, sub-second timestamps, other dtypes)
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return None
+    values = series.to_numpy()
+
+    if dtype.kind in 'iu':
+        return pa.array(values)
+
+    if dtype.kind == 'f':
+        # pandas writes float repr ('1.0', '1e-05'); Arrow would write '1', '0.00001'
+        missing = np.isnan(values)
+        return pa.array(values.astype(str), mask=missing)
+
+    if dtype.kind == 'b':
+        return pa.array(np.where(values, 'True', 'False'))
+
+    if dtype.kind == 'M' and dtype == np.dtype('datetime64[ns]'):
+        missing = np.isnat(values)
+        ns = values[~missing].view(np.int64)
+        if (ns % (86400 * 10**9) == 0).all():
+            # All midnight: pandas writes plain YYYY-MM-DD dates
+            return pa.array(values.astype('datetime64[D]'), mask=missing, type=pa.date32())
+        if (ns % 10**9 == 0).all():
+            return pa.array(values.astype('datetime64[s]'), mask=missing)
+        return None
+
+    if dtype == object:
+        inferred = pd.api.types.infer_dtype(values, skipna=True)
+        if inferred == 'date':
+            return pa.array(values, type=pa.date32(), from_pandas=True)
+        if inferred in ('string', 'empty'):
+            arr = pa.array(values, type=pa.string(), from_pandas=True)
+            if pc.any(pc.match_substring_regex(arr, _NEEDS_QUOTING)).as_py():
+                return None
+            return arr
+    return None
+
+
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Serialize a DataFrame to CSV bytes, as DataFrame.to_csv(index=False) does
+
+    Midnight-only datetime columns are written as plain YYYY-MM-DD dates, as
+    pandas does; that includes the Arrow-backed DATE columns from
+    _db.read_frame, which are timestamps. With pyarrow installed, frames
+    whose columns it can render
+    identically (numbers, bools, dates, whole-second timestamps and strings
+    that need no quoting) are written by pyarrow's CSV writer; anything else
+    falls back to pandas, so the bytes never depend on which writer ran.
+
+    Args:
+        df: Frame to export
+
+    Returns:
+        CSV file contents (with header row) as bytes
+    """
+    arrow_cols = [i for i, dtype in enumerate(df.dtypes)
+                  if isinstance(dtype, (pd.ArrowDtype, pd.StringDtype))]
+    if arrow_cols:
+        df = df.copy(deep=False)
+        for i in arrow_cols:
+            df.isetitem(i, _numpy_backed(df.iloc[:, i]))
+
+    # A single column needs pandas' quoting of empty fields ('""')
+    columns = [str(col) for col in df.columns]
+    if pa is not None and len(columns) > 1 and not any(re.search(_NEEDS_QUOTING, c) for c in columns):
+        arrays = [_arrow_column(df.iloc[:, i]) for i in range(len(columns))]
+        if all(arr is not None for arr in arrays):
+            buffer = io.BytesIO()
+            # The header is written here: pyarrow always quotes column names
+            buffer.write((','.join(columns) + '\n').encode())
+            table = pa.Table.from_arrays(arrays, names=columns)
+            pa_csv.write_csv(table, buffer,
+                             pa_csv.WriteOptions(include_header=False, quoting_style='none'))
+            return buffer.getvalue()
+
+    return df.to_csv(index=False, lineterminator='\n').encode()
@@ -0,0 +1,92 @@
+"""
+Database access shared by dashboard pages
+"""
+import io
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from database.db_manager import db_manager
+
+try:
+    # Optional: Arrow-backed columns build faster and pickle into st.cache_data cheaply
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+@st.cache_resource
+def get_engine():
+    """
+    Process-wide SQLAlchemy engine, reused across reruns, pages and sessions
+
+    Loaders must not call db_manager.close(): that disposes the pooled engine
+    every other cached loader is holding.
+    """
+    return db_manager.connect()
+
+
+# Source tables are batch-updated nightly, so loaded frames stay valid for a day;
+# max_entries bounds memory across store/department filter combinations
+DATA_TTL = 24 * 60 * 60
+MAX_CACHE_ENTRIES = 64
+
+
+def read_frame(query: str, params: dict = None) -> pd.DataFrame:
+    """
+    Run a parameterized query on the shared engine
+
+    With pyarrow installed the frame is Arrow-backed (dtype_backend='pyarrow').
+    DECIMAL columns are then cast to double and DATE columns to timestamps, so
+    callers see the same float/datetime64 values as the NumPy backend.
+    (_csv.csv_bytes writes those midnight timestamps back as plain dates.)
+
+    Args:
+        query: SQL text with :name placeholders
+        params: Bound parameter values
+
+    Returns:
+        Query result as a DataFrame
+    """
+    if pa is None:
+        return pd.read_sql(text(query), get_engine(), params=params)
+
+    df = pd.read_sql(text(query), get_engine(), params=params, dtype_backend='pyarrow')
+    for col, dtype in df.dtypes.items():
+        if not isinstance(dtype, pd.ArrowDtype):
+            continue
+        if pa.types.is_decimal(dtype.pyarrow_dtype):
+            df[col] = df[col].astype(pd.ArrowDtype(pa.float64()))
+        elif pa.types.is_date(dtype.pyarrow_dtype):
+            df[col] = df[col].astype(pd.ArrowDtype(pa.timestamp('ns')))
+    return df
+
+
+def copy_csv(query: str, params: dict = None) -> bytes:
+    """
+    Run a parameterized query through COPY ... TO STDOUT as CSV
+
+    Postgres formats the CSV with its own writer and the bytes stream straight
+    into a buffer, with no DataFrame or Python row objects built in between.
+
+    Args:
+        query: SQL SELECT with :name placeholders
+        params: Bound parameter values
+
+    Returns:
+        CSV file contents (with header row) as bytes
+    """
+    engine = get_engine()
+    # COPY takes no bind parameters, so let the driver quote them into the text
+    compiled = text(query).compile(dialect=engine.dialect)
+
+    buffer = io.BytesIO()
+    raw_conn = engine.raw_connection()
+    try:
+        with raw_conn.cursor() as cur:
+            select = cur.mogrify(compiled.string, params or {}).decode()
+            cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    finally:
+        raw_conn.close()
+    return buffer.getvalue()
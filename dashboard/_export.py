@@ -0,0 +1,19 @@
+"""
+Download helpers shared by dashboard pages
+"""
+import pandas as pd
+import streamlit as st
+
+from dashboard._csv import csv_bytes
+
+
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Serialize a DataFrame to CSV bytes for st.download_button
+
+    Cached on the frame's content, so reruns reuse the bytes instead of
+    re-serializing the whole table every time the page renders. The bytes
+    match DataFrame.to_csv(index=False) whichever writer produces them.
+    """
+    return csv_bytes(df)
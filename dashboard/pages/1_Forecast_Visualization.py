@@ -4,8 +4,7 @@ Interactive sales forecast visualization and analysis
 """
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
+import numpy as np
 from datetime import datetime
 import sys
 from pathlib import Path
@@ -13,7 +12,10 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from database.db_manager import db_manager
+from dashboard._db import get_engine, read_frame, DATA_TTL, MAX_CACHE_ENTRIES
+from dashboard._charts import downsample
+from dashboard._export import to_csv_bytes
+from dashboard._compat import fragment
 
 st.set_page_config(page_title="Forecast Visualization", page_icon="📊", layout="wide")
 
@@ -24,61 +26,91 @@ st.markdown("Explore 8-week sales predictions with interactive charts and filter
 st.sidebar.header("Filters")
 
 
-@st.cache_data
+# Options are tiny and identical for every session: cache_resource shares one
+# immutable copy process-wide (no per-rerun unpickling), refreshed daily
+@st.cache_resource(ttl=DATA_TTL, show_spinner=False)
 def load_filter_options():
-    engine = db_manager.connect()
-    stores = pd.read_sql("SELECT DISTINCT store_id FROM stores ORDER BY store_id", engine)
-    depts = pd.read_sql("SELECT DISTINCT dept_id FROM raw_sales ORDER BY dept_id", engine)
-    db_manager.close()
-    return stores['store_id'].tolist(), depts['dept_id'].tolist()
+    engine = get_engine()
+    # One roundtrip: both option lists come back as arrays in a single row
+    options = pd.read_sql("""
+        SELECT
+            (SELECT array_agg(DISTINCT store_id ORDER BY store_id) FROM stores) AS stores,
+            (SELECT array_agg(DISTINCT dept_id ORDER BY dept_id) FROM raw_sales) AS depts
+    """, engine).iloc[0]
+    return tuple(options['stores'] or ()), tuple(options['depts'] or ())
 
 
 stores, depts = load_filter_options()
-selected_store = st.sidebar.selectbox("Select Store", ["All"] + stores)
-selected_dept = st.sidebar.selectbox("Select Department", ["All"] + depts)
+selected_store = st.sidebar.selectbox("Select Store", ["All", *stores])
+selected_dept = st.sidebar.selectbox("Select Department", ["All", *depts])
 
 
 # ============================================================
 # FIX: Load REAL forecasts from the forecasts table
 # ============================================================
-@st.cache_data(ttl=300)
-def load_forecasts(store_filter, dept_filter):
-    """Load actual model forecasts from the forecasts table"""
-    engine = db_manager.connect()
+def _scope_filters(store_filter, dept_filter):
+    """WHERE clause and bound parameters for the store/dept filters"""
+    conditions, params = [], {}
+    if store_filter != "All":
+        conditions.append("store_id = :store_id")
+        params['store_id'] = store_filter
+    if dept_filter != "All":
+        conditions.append("dept_id = :dept_id")
+        params['dept_id'] = dept_filter
+
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where_clause, params
+
+
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_forecasts_weekly_agg(store_filter, dept_filter):
+    """Load forecasts summed per forecast week (one row per week) for charts and metrics"""
+    where_clause, params = _scope_filters(store_filter, dept_filter)
+
+    # Aggregate in SQL so only ~8 weekly rows cross the wire
+    query = f"""
+        SELECT
+            forecast_date,
+            SUM(predicted_sales) AS predicted_sales,
+            SUM(prediction_lower) AS lower_bound,
+            SUM(prediction_upper) AS upper_bound
+        FROM forecasts
+        {where_clause}
+        GROUP BY forecast_date
+        ORDER BY forecast_date ASC
+    """
+    df = read_frame(query, params)
+
+    return df
 
-    query = """
+
+# cache_resource hands back the cached frame itself instead of unpickling a copy
+# on every rerun; callers must treat it as read-only
+@st.cache_resource(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_forecasts_detail(store_filter, dept_filter):
+    """Load row-level model forecasts from the forecasts table (Data Table tab)"""
+    where_clause, params = _scope_filters(store_filter, dept_filter)
+
+    query = f"""
         SELECT
             store_id, dept_id, forecast_date,
             predicted_sales, prediction_lower AS lower_bound,
             prediction_upper AS upper_bound,
             model_name, confidence_score
         FROM forecasts
+        {where_clause}
         ORDER BY forecast_date ASC
     """
-    df = pd.read_sql(query, engine)
-    db_manager.close()
-
-    if store_filter != "All":
-        df = df[df['store_id'] == store_filter]
-    if dept_filter != "All":
-        df = df[df['dept_id'] == dept_filter]
+    df = read_frame(query, params)
 
     return df
 
 
-@st.cache_data(ttl=300)
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
 def load_historical_data(store_filter, dept_filter):
     """Load historical data pre-aggregated by week for charting"""
-    engine = db_manager.connect()
-
-    # Build WHERE clause based on filters
-    conditions = []
-    if store_filter != "All":
-        conditions.append(f"store_id = {store_filter}")
-    if dept_filter != "All":
-        conditions.append(f"dept_id = {dept_filter}")
-
-    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    # Build WHERE clause based on filters (bound parameters, never interpolated)
+    where_clause, params = _scope_filters(store_filter, dept_filter)
 
     # Pre-aggregate in SQL to avoid loading millions of rows
     query = f"""
@@ -94,18 +126,38 @@ def load_historical_data(store_filter, dept_filter):
         ORDER BY feature_date
     """
 
-    df = pd.read_sql(query, engine)
-    db_manager.close()
+    df = read_frame(query, params)
+
+    return df
+
+
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_holiday_weeks(store_filter, dept_filter):
+    """Load only holiday weeks (weekly sales totals) for the chart overlay"""
+    where_clause, params = _scope_filters(store_filter, dept_filter)
+    where_clause = f"{where_clause} AND is_holiday" if where_clause else "WHERE is_holiday"
+
+    query = f"""
+        SELECT
+            feature_date,
+            SUM(weekly_sales) AS weekly_sales
+        FROM engineered_features
+        {where_clause}
+        GROUP BY feature_date
+        ORDER BY feature_date
+    """
+
+    df = read_frame(query, params)
 
     return df
 
 
 with st.spinner("Loading data..."):
-    forecasts = load_forecasts(selected_store, selected_dept)
+    forecast_agg = load_forecasts_weekly_agg(selected_store, selected_dept)
     historical_data = load_historical_data(selected_store, selected_dept)
 
 # Check if forecasts exist
-if forecasts.empty:
+if forecast_agg.empty:
     st.error(
         "⚠️ No forecasts found in the database. "
         "Run `python models/generate_forecasts.py` first to generate predictions."
@@ -116,25 +168,27 @@ if forecasts.empty:
 st.markdown("### 📈 Forecast Summary")
 col1, col2, col3, col4 = st.columns(4)
 
+# All summary metrics come from the pre-aggregated weekly rows
+# (one row per forecast week, so the weekly average is just total / weeks)
+forecast_weeks = len(forecast_agg)
+total_forecast = forecast_agg['predicted_sales'].sum()
+avg_weekly = total_forecast / forecast_weeks
+
 with col1:
-    total_forecast = forecasts['predicted_sales'].sum()
     st.metric("Total Forecasted Sales (8 weeks)", f"${total_forecast:,.0f}")
 
 with col2:
     # Average total sales per forecast week (across all stores/depts)
-    avg_weekly = forecasts.groupby('forecast_date')['predicted_sales'].sum().mean()
     st.metric("Avg Weekly Sales (All Stores)", f"${avg_weekly:,.0f}")
 
 with col3:
-    forecast_weeks = forecasts['forecast_date'].nunique()
-    st.metric("Forecast Weeks", int(forecast_weeks))
+    st.metric("Forecast Weeks", forecast_weeks)
 
 with col4:
     if not historical_data.empty:
         # Compare forecast avg per week vs historical avg per week
         hist_avg = historical_data['weekly_sales'].mean()
-        forecast_total_per_week = forecasts.groupby('forecast_date')['predicted_sales'].sum().mean()
-        growth = ((forecast_total_per_week / hist_avg) - 1) * 100 if hist_avg > 0 else 0
+        growth = ((avg_weekly / hist_avg) - 1) * 100 if hist_avg > 0 else 0
         st.metric("vs Historical Avg", f"{growth:+.1f}%")
     else:
         st.metric("vs Historical Avg", "N/A")
@@ -145,21 +199,18 @@ st.markdown("---")
 tab1, tab2, tab3 = st.tabs(["📈 Forecast Chart", "📊 Historical Trends", "📋 Data Table"])
 
 with tab1:
+    # Plotly is imported only once the page has data to chart
+    import plotly.graph_objects as go
+
     st.markdown("### 8-Week Sales Forecast")
 
     # Historical data is already aggregated by date
     hist_agg = historical_data.sort_values('feature_date').tail(20)
 
-    forecast_agg = forecasts.groupby('forecast_date').agg(
-        predicted_sales=('predicted_sales', 'sum'),
-        lower_bound=('lower_bound', 'sum'),
-        upper_bound=('upper_bound', 'sum'),
-    ).reset_index().sort_values('forecast_date')
-
     fig = go.Figure()
 
-    # Historical
-    fig.add_trace(go.Scatter(
+    # Historical (WebGL traces; the small CI polygon below stays SVG)
+    fig.add_trace(go.Scattergl(
         x=hist_agg['feature_date'],
         y=hist_agg['weekly_sales'],
         mode='lines+markers',
@@ -169,7 +220,7 @@ with tab1:
     ))
 
     # Forecast
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=forecast_agg['forecast_date'],
         y=forecast_agg['predicted_sales'],
         mode='lines+markers',
@@ -178,10 +229,12 @@ with tab1:
         marker=dict(size=8)
     ))
 
-    # Confidence interval
+    # Confidence interval (upper edge forward, lower edge back, as one closed polygon)
+    forecast_dates = forecast_agg['forecast_date'].to_numpy()
     fig.add_trace(go.Scatter(
-        x=forecast_agg['forecast_date'].tolist() + forecast_agg['forecast_date'].tolist()[::-1],
-        y=forecast_agg['upper_bound'].tolist() + forecast_agg['lower_bound'].tolist()[::-1],
+        x=np.concatenate([forecast_dates, forecast_dates[::-1]]),
+        y=np.concatenate([forecast_agg['upper_bound'].to_numpy(),
+                          forecast_agg['lower_bound'].to_numpy()[::-1]]),
         fill='toself',
         fillcolor='rgba(255, 107, 53, 0.2)',
         line=dict(color='rgba(255,255,255,0)'),
@@ -193,7 +246,10 @@ with tab1:
         title="Sales Forecast with Confidence Interval",
         xaxis_title="Date",
         yaxis_title="Weekly Sales ($)",
-        hovermode='x unified',
+        # x hover over date-typed, SQL-sorted traces; same readout on weekly data
+        # without the unified label's scan of every trace
+        hovermode='x',
+        xaxis_type='date',
         height=500,
         template='plotly_white'
     )
@@ -201,19 +257,28 @@ with tab1:
     st.plotly_chart(fig, use_container_width=True)
 
 with tab2:
+    import plotly.graph_objects as go
+
     st.markdown("### Historical Sales Trends")
 
     # Historical data is already aggregated
     full_hist_agg = historical_data.sort_values('feature_date')
 
-    fig2 = px.line(
-        full_hist_agg, x='feature_date', y='weekly_sales',
-        title='Historical Weekly Sales',
-        labels={'feature_date': 'Date', 'weekly_sales': 'Total Sales ($)'}
-    )
+    # LTTB-downsample the line so the browser never gets more than ~2000 points
+    line_data = downsample(full_hist_agg, 'feature_date', 'weekly_sales')
+
+    # WebGL traces (px.line would emit an SVG Scatter)
+    fig2 = go.Figure()
+    fig2.add_trace(go.Scattergl(
+        x=line_data['feature_date'].to_numpy(),
+        y=line_data['weekly_sales'].to_numpy(),
+        mode='lines',
+        name='Weekly Sales',
+        showlegend=False
+    ))
 
-    holiday_dates = full_hist_agg[full_hist_agg['is_holiday'] == True]
-    fig2.add_trace(go.Scatter(
+    holiday_dates = load_holiday_weeks(selected_store, selected_dept)
+    fig2.add_trace(go.Scattergl(
         x=holiday_dates['feature_date'],
         y=holiday_dates['weekly_sales'],
         mode='markers',
@@ -221,25 +286,53 @@ with tab2:
         marker=dict(size=12, color='red', symbol='star')
     ))
 
-    fig2.update_layout(height=500, template='plotly_white')
+    fig2.update_layout(
+        title='Historical Weekly Sales',
+        xaxis_title='Date',
+        yaxis_title='Total Sales ($)',
+        hovermode='x',
+        xaxis_type='date',
+        height=500,
+        template='plotly_white'
+    )
     st.plotly_chart(fig2, use_container_width=True)
 
-with tab3:
+@fragment
+def forecast_table(store_filter, dept_filter):
+    """Row-level forecast table and CSV download (reruns on its own as a fragment)"""
     st.markdown("### Forecast Data Table")
 
+    # Row-level detail is only needed for this table and the CSV export
+    forecasts = load_forecasts_detail(store_filter, dept_filter)
+
     display_df = forecasts[[
         'forecast_date', 'store_id', 'dept_id',
         'predicted_sales', 'lower_bound', 'upper_bound', 'model_name'
-    ]].copy()
-
-    display_df['predicted_sales'] = display_df['predicted_sales'].apply(lambda x: f"${x:,.2f}")
-    display_df['lower_bound'] = display_df['lower_bound'].apply(lambda x: f"${x:,.2f}")
-    display_df['upper_bound'] = display_df['upper_bound'].apply(lambda x: f"${x:,.2f}")
-    display_df.columns = ['Date', 'Store', 'Dept', 'Forecast', 'Lower Bound', 'Upper Bound', 'Model']
-
-    st.dataframe(display_df, use_container_width=True, height=400)
+    ]]
+
+    # Send one page of rows to the browser at a time
+    page_size = 50
+    n_pages = max((len(display_df) - 1) // page_size + 1, 1)
+    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1,
+                           help=f"{len(display_df):,} rows, {page_size} per page")
+
+    # Currency formatting is done client-side; columns stay numeric (and sortable)
+    st.dataframe(
+        display_df.iloc[(page - 1) * page_size:page * page_size],
+        use_container_width=True,
+        height=400,
+        column_config={
+            'forecast_date': 'Date',
+            'store_id': 'Store',
+            'dept_id': 'Dept',
+            'predicted_sales': st.column_config.NumberColumn('Forecast', format='$%.2f'),
+            'lower_bound': st.column_config.NumberColumn('Lower Bound', format='$%.2f'),
+            'upper_bound': st.column_config.NumberColumn('Upper Bound', format='$%.2f'),
+            'model_name': 'Model',
+        },
+    )
 
-    csv = forecasts.to_csv(index=False)
+    csv = to_csv_bytes(forecasts)
     st.download_button(
         label="📥 Download Forecast CSV",
         data=csv,
@@ -247,5 +340,9 @@ with tab3:
         mime="text/csv"
     )
 
+
+with tab3:
+    forecast_table(selected_store, selected_dept)
+
 st.markdown("---")
 st.info("💡 **Tip**: Use the filters in the sidebar to focus on specific stores or departments")
\ No newline at end of file
@@ -4,6 +4,7 @@ Interactive interface for multi-agent AI system
 """
 import streamlit as st
 import pandas as pd
+from sqlalchemy import text
 import sys
 from pathlib import Path
 
@@ -11,8 +12,8 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from database.db_manager import db_manager
-from agents.orchestrator import AgentOrchestrator
+from dashboard._db import get_engine, DATA_TTL, MAX_CACHE_ENTRIES
+from dashboard._compat import fragment
 
 st.set_page_config(page_title="AI Insights", page_icon="🤖", layout="wide")
 
@@ -22,10 +23,10 @@ st.markdown("Get intelligent recommendations from our multi-agent AI system")
 # Initialize orchestrator
 @st.cache_resource
 def get_orchestrator():
+    # Imported here so the agents package loads only when insights are requested
+    from agents.orchestrator import AgentOrchestrator
     return AgentOrchestrator()
 
-orchestrator = get_orchestrator()
-
 # Sidebar - Agent selection
 st.sidebar.header("AI Agent Selection")
 agent_type = st.sidebar.radio(
@@ -36,28 +37,45 @@ agent_type = st.sidebar.radio(
 st.sidebar.markdown("---")
 st.sidebar.header("Analysis Scope")
 
-@st.cache_data
+# Options are tiny and identical for every session: cache_resource shares one
+# immutable copy process-wide (no per-rerun unpickling), refreshed daily
+@st.cache_resource(ttl=DATA_TTL, show_spinner=False)
 def load_filter_options():
-    engine = db_manager.connect()
-    stores = pd.read_sql("SELECT DISTINCT store_id FROM forecasts ORDER BY store_id", engine)
-    depts = pd.read_sql("SELECT DISTINCT dept_id FROM forecasts ORDER BY dept_id", engine)
-    db_manager.close()
-    return stores['store_id'].tolist(), depts['dept_id'].tolist()
+    engine = get_engine()
+    # One roundtrip: both option lists come back as arrays in a single row
+    options = pd.read_sql("""
+        SELECT
+            array_agg(DISTINCT store_id ORDER BY store_id) AS stores,
+            array_agg(DISTINCT dept_id ORDER BY dept_id) AS depts
+        FROM forecasts
+    """, engine).iloc[0]
+    return tuple(options['stores'] or ()), tuple(options['depts'] or ())
 
 available_stores, available_depts = load_filter_options()
-selected_store = st.sidebar.selectbox("Store", ["All"] + available_stores)
-selected_dept = st.sidebar.selectbox("Department", ["All"] + available_depts)
+selected_store = st.sidebar.selectbox("Store", ["All", *available_stores])
+selected_dept = st.sidebar.selectbox("Department", ["All", *available_depts])
 
 
 # ============================================================
 # FIX: Load REAL forecasts from database instead of faking them
 # ============================================================
-@st.cache_data(ttl=300)
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
 def load_forecasts(store_filter, dept_filter):
     """Load actual model forecasts from the forecasts table"""
-    engine = db_manager.connect()
+    engine = get_engine()
+
+    # Filter in SQL with bound parameters so only the selected rows are transferred
+    conditions, params = [], {}
+    if store_filter != "All":
+        conditions.append("store_id = :store_id")
+        params['store_id'] = store_filter
+    if dept_filter != "All":
+        conditions.append("dept_id = :dept_id")
+        params['dept_id'] = dept_filter
+
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
 
-    query = """
+    query = f"""
         SELECT
             store_id,
             dept_id,
@@ -68,30 +86,35 @@ def load_forecasts(store_filter, dept_filter):
             model_name,
             confidence_score
         FROM forecasts
+        {where_clause}
         ORDER BY forecast_date ASC
     """
-    df = pd.read_sql(query, engine)
-    db_manager.close()
-
-    if store_filter != "All":
-        df = df[df['store_id'] == store_filter]
-    if dept_filter != "All":
-        df = df[df['dept_id'] == dept_filter]
+    # Sales values fit in float32; halves memory for every agent reduction.
+    # Categorical ids let filters and agent factorize() work on integer codes.
+    df = pd.read_sql(text(query), engine, params=params, dtype={
+        'store_id': 'category',
+        'dept_id': 'category',
+        'predicted_sales': 'float32',
+        'lower_bound': 'float32',
+        'upper_bound': 'float32',
+    })
 
     return df
 
 
-@st.cache_data(ttl=300)
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
 def load_historical_data(store_filter, dept_filter):
     """Load historical sales data for context"""
-    engine = db_manager.connect()
+    engine = get_engine()
 
-    # Build WHERE clause based on filters
-    conditions = []
+    # Build WHERE clause based on filters (bound parameters, never interpolated)
+    conditions, params = [], {}
     if store_filter != "All":
-        conditions.append(f"store_id = {store_filter}")
+        conditions.append("store_id = :store_id")
+        params['store_id'] = store_filter
     if dept_filter != "All":
-        conditions.append(f"dept_id = {dept_filter}")
+        conditions.append("dept_id = :dept_id")
+        params['dept_id'] = dept_filter
 
     where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
 
@@ -104,106 +127,123 @@ def load_historical_data(store_filter, dept_filter):
         ORDER BY feature_date DESC
     """
 
-    df = pd.read_sql(query, engine)
-    db_manager.close()
+    df = pd.read_sql(text(query), engine, params=params, dtype={
+        'store_id': 'category',
+        'dept_id': 'category',
+        'weekly_sales': 'float32',
+    })
 
     return df
 
 
+@fragment
+def ask_ai_section(agent_type, selected_store, selected_dept):
+    """
+    Question box, button and agent results
+
+    Runs as a fragment, so typing a question or clicking the button reruns only
+    this section, not the sidebar filters above it.
+    """
+    user_question = st.text_area(
+        "What would you like to know?",
+        placeholder="Example: What are the key drivers of sales for this store? How should I optimize inventory levels?",
+        height=100
+    )
+
+    analyze_button = st.button("🚀 Get AI Insights", type="primary")
+
+    if analyze_button and user_question:
+        with st.spinner("🤖 AI agents are analyzing your data..."):
+            # Load REAL data
+            forecasts = load_forecasts(selected_store, selected_dept)
+            historical_data = load_historical_data(selected_store, selected_dept)
+
+            # Check if forecasts exist
+            if forecasts.empty:
+                st.error(
+                    "⚠️ No forecasts found in the database. "
+                    "Please run `python models/generate_forecasts.py` first."
+                )
+                return
+
+            orchestrator = get_orchestrator()
+
+            if agent_type == "📊 Demand Forecasting":
+                st.markdown("### 📊 Demand Forecasting Agent Response")
+
+                context = {
+                    'forecasts': forecasts,
+                    'historical_sales': historical_data,
+                    'store_id': selected_store if selected_store != "All" else None,
+                    'dept_id': selected_dept if selected_dept != "All" else None,
+                    'question': user_question
+                }
+
+                result = orchestrator.ask_agent('demand', user_question, context)
+                st.markdown(result['response'])
+
+            elif agent_type == "📦 Inventory Optimization":
+                st.markdown("### 📦 Inventory Optimization Agent Response")
+
+                context = {
+                    'forecasts': forecasts,
+                    'service_level': 0.95,
+                    'lead_time_days': 7,
+                    'store_id': selected_store if selected_store != "All" else None,
+                    'dept_id': selected_dept if selected_dept != "All" else None,
+                    'question': user_question
+                }
+
+                result = orchestrator.ask_agent('inventory', user_question, context)
+                st.markdown(result['response'])
+
+            elif agent_type == "⚠️ Anomaly Detection":
+                st.markdown("### ⚠️ Anomaly Detection Agent Response")
+
+                result = orchestrator.get_agent('anomaly').detect_anomalies(
+                    historical_data, threshold=3.0
+                )
+                st.markdown(result['response'])
+
+            else:  # All Agents
+                st.markdown("### 🔄 Comprehensive Multi-Agent Analysis")
+
+                # Update the summary as each agent finishes instead of waiting for all three
+                summary_box = st.empty()
+                for results in orchestrator.iter_analyze_forecast(
+                    forecasts=forecasts,
+                    historical_sales=historical_data,
+                    store_id=selected_store if selected_store != "All" else None,
+                    dept_id=selected_dept if selected_dept != "All" else None
+                ):
+                    summary_box.info(results['summary'])
+
+                tab1, tab2, tab3 = st.tabs([
+                    "📊 Demand Analysis",
+                    "📦 Inventory Recommendations",
+                    "⚠️ Anomaly Detection"
+                ])
+
+                with tab1:
+                    st.markdown("#### Demand Forecasting Insights")
+                    st.markdown(results['detailed_insights']['demand_analysis']['response'])
+
+                with tab2:
+                    st.markdown("#### Inventory Optimization Recommendations")
+                    st.markdown(results['detailed_insights']['inventory_recommendations']['response'])
+
+                with tab3:
+                    st.markdown("#### Anomaly Detection Report")
+                    st.markdown(results['detailed_insights']['anomaly_detection']['response'])
+
+    elif analyze_button and not user_question:
+        st.warning("⚠️ Please enter a question to get AI insights")
+
+
 # Main content
 st.markdown("### 💬 Ask the AI")
 
-user_question = st.text_area(
-    "What would you like to know?",
-    placeholder="Example: What are the key drivers of sales for this store? How should I optimize inventory levels?",
-    height=100
-)
-
-analyze_button = st.button("🚀 Get AI Insights", type="primary")
-
-if analyze_button and user_question:
-    with st.spinner("🤖 AI agents are analyzing your data..."):
-        # Load REAL data
-        forecasts = load_forecasts(selected_store, selected_dept)
-        historical_data = load_historical_data(selected_store, selected_dept)
-
-        # Check if forecasts exist
-        if forecasts.empty:
-            st.error(
-                "⚠️ No forecasts found in the database. "
-                "Please run `python models/generate_forecasts.py` first."
-            )
-            st.stop()
-
-        if agent_type == "📊 Demand Forecasting":
-            st.markdown("### 📊 Demand Forecasting Agent Response")
-
-            context = {
-                'forecasts': forecasts,
-                'historical_sales': historical_data,
-                'store_id': selected_store if selected_store != "All" else None,
-                'dept_id': selected_dept if selected_dept != "All" else None,
-                'question': user_question
-            }
-
-            result = orchestrator.ask_agent('demand', user_question, context)
-            st.markdown(result['response'])
-
-        elif agent_type == "📦 Inventory Optimization":
-            st.markdown("### 📦 Inventory Optimization Agent Response")
-
-            context = {
-                'forecasts': forecasts,
-                'service_level': 0.95,
-                'lead_time_days': 7,
-                'store_id': selected_store if selected_store != "All" else None,
-                'dept_id': selected_dept if selected_dept != "All" else None,
-                'question': user_question
-            }
-
-            result = orchestrator.ask_agent('inventory', user_question, context)
-            st.markdown(result['response'])
-
-        elif agent_type == "⚠️ Anomaly Detection":
-            st.markdown("### ⚠️ Anomaly Detection Agent Response")
-
-            result = orchestrator.get_agent('anomaly').detect_anomalies(
-                historical_data, threshold=3.0
-            )
-            st.markdown(result['response'])
-
-        else:  # All Agents
-            st.markdown("### 🔄 Comprehensive Multi-Agent Analysis")
-
-            results = orchestrator.analyze_forecast(
-                forecasts=forecasts,
-                historical_sales=historical_data,
-                store_id=selected_store if selected_store != "All" else None,
-                dept_id=selected_dept if selected_dept != "All" else None
-            )
-
-            st.info(results['summary'])
-
-            tab1, tab2, tab3 = st.tabs([
-                "📊 Demand Analysis",
-                "📦 Inventory Recommendations",
-                "⚠️ Anomaly Detection"
-            ])
-
-            with tab1:
-                st.markdown("#### Demand Forecasting Insights")
-                st.markdown(results['detailed_insights']['demand_analysis']['response'])
-
-            with tab2:
-                st.markdown("#### Inventory Optimization Recommendations")
-                st.markdown(results['detailed_insights']['inventory_recommendations']['response'])
-
-            with tab3:
-                st.markdown("#### Anomaly Detection Report")
-                st.markdown(results['detailed_insights']['anomaly_detection']['response'])
-
-elif analyze_button and not user_question:
-    st.warning("⚠️ Please enter a question to get AI insights")
+ask_ai_section(agent_type, selected_store, selected_dept)
 
 # Example questions
 st.markdown("---")
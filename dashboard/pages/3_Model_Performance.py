@@ -2,8 +2,10 @@
 Model Performance Page
 Display model metrics, feature importance, and evaluation results
 """
+import json
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import sys
@@ -13,7 +15,8 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from database.db_manager import db_manager
+from dashboard._db import get_engine, DATA_TTL
+from dashboard._export import to_csv_bytes
 
 st.set_page_config(page_title="Model Performance", page_icon="📈", layout="wide")
 
@@ -21,9 +24,16 @@ st.title("📈 Model Performance Metrics")
 st.markdown("Evaluate forecasting model accuracy and feature importance")
 
 # Load model metadata
-@st.cache_data(ttl=600)
+@st.cache_data(ttl=DATA_TTL, show_spinner=False)
 def load_model_metadata():
-    engine = db_manager.connect()
+    """
+    Load the latest model_metadata row with its JSON columns already decoded
+    
+    Returns:
+        Dict of column values ('parameters' as a dict, 'feature_importance'
+        as a DataFrame), or None if no model has been trained
+    """
+    engine = get_engine()
     
     query = """
         SELECT *
@@ -33,14 +43,23 @@ def load_model_metadata():
     """
     
     df = pd.read_sql(query, engine)
-    db_manager.close()
+    if df.empty:
+        return None
+    
+    # JSON columns may arrive decoded (JSONB) or as text; parse once here, not per rerun
+    row = df.iloc[0].to_dict()
+    params = row['parameters']
+    row['parameters'] = params if isinstance(params, dict) else json.loads(params)
+    importance = row['feature_importance']
+    row['feature_importance'] = pd.DataFrame(
+        importance if isinstance(importance, list) else json.loads(importance)
+    )
     
-    return df
+    return row
 
-metadata = load_model_metadata()
+latest_model = load_model_metadata()
 
-if len(metadata) > 0:
-    latest_model = metadata.iloc[0]
+if latest_model is not None:
     
     # Model Overview
     st.markdown("### 🎯 Latest Model Performance")
@@ -75,9 +94,7 @@ if len(metadata) > 0:
     
     with col2:
         st.markdown("### ⚙️ Hyperparameters")
-        import json
-        params = latest_model['parameters'] if isinstance(latest_model['parameters'], dict) else json.loads(latest_model['parameters'])
-        for key, value in params.items():
+        for key, value in latest_model['parameters'].items():
             st.write(f"**{key}:** {value}")
     
     st.markdown("---")
@@ -85,11 +102,12 @@ if len(metadata) > 0:
     # Feature Importance
     st.markdown("### 🔍 Feature Importance Analysis")
     
-    import json
-    feature_importance = pd.DataFrame(latest_model['feature_importance'] if isinstance(latest_model['feature_importance'], list) else json.loads(latest_model['feature_importance']))
-    feature_importance['importance'] = (feature_importance['importance'] / feature_importance['importance'].sum()) * 100
-    # Top 20 features
-    top_features = feature_importance.head(20)
+    feature_importance = latest_model['feature_importance']
+    # Normalize to percentages in one NumPy pass
+    importance = feature_importance['importance'].to_numpy(dtype=np.float64)
+    feature_importance['importance'] = importance * (100.0 / importance.sum())
+    # Top 20 features (nlargest doesn't rely on the stored order being sorted)
+    top_features = feature_importance.nlargest(20, 'importance')
     
     fig = px.bar(
         top_features,
@@ -113,24 +131,21 @@ if len(metadata) > 0:
     # Feature categories
     st.markdown("### 📊 Feature Categories")
     
-    # Categorize features
-    def categorize_feature(feature_name):
-        if 'lag' in feature_name:
-            return 'Lag Features'
-        elif 'rolling' in feature_name:
-            return 'Rolling Statistics'
-        elif any(x in feature_name for x in ['week', 'month', 'quarter']):
-            return 'Temporal Features'
-        elif any(x in feature_name for x in ['temperature', 'fuel', 'cpi', 'unemployment']):
-            return 'Economic Indicators'
-        elif 'markdown' in feature_name:
-            return 'Markdown Features'
-        elif 'store' in feature_name:
-            return 'Store Features'
-        else:
-            return 'Other'
-    
-    feature_importance['category'] = feature_importance['feature'].apply(categorize_feature)
+    # Categorize features: one vectorized str.contains per category, first match wins
+    features = feature_importance['feature']
+    category_rules = [
+        ('Lag Features', 'lag'),
+        ('Rolling Statistics', 'rolling'),
+        ('Temporal Features', 'week|month|quarter'),
+        ('Economic Indicators', 'temperature|fuel|cpi|unemployment'),
+        ('Markdown Features', 'markdown'),
+        ('Store Features', 'store'),
+    ]
+    feature_importance['category'] = np.select(
+        [features.str.contains(pattern) for _, pattern in category_rules],
+        [label for label, _ in category_rules],
+        default='Other'
+    )
     
     category_importance = feature_importance.groupby('category')['importance'].sum().reset_index()
     category_importance = category_importance.sort_values('importance', ascending=False)
@@ -149,13 +164,17 @@ if len(metadata) > 0:
     # Feature table
     st.markdown("### 📋 All Features")
     
-    feature_display = feature_importance.copy()
-    feature_display['importance'] = feature_display['importance'].apply(lambda x: f"{x:,.2f}")
-    
-    st.dataframe(feature_display, use_container_width=True, height=400)
+    st.dataframe(
+        feature_importance,
+        use_container_width=True,
+        height=400,
+        column_config={
+            'importance': st.column_config.NumberColumn('importance', format='%.2f'),
+        },
+    )
     
     # Download button
-    csv = feature_importance.to_csv(index=False)
+    csv = to_csv_bytes(feature_importance)
     st.download_button(
         label="📥 Download Feature Importance CSV",
         data=csv,
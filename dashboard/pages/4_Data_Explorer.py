@@ -6,6 +6,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from itertools import combinations
 import sys
 from pathlib import Path
 
@@ -13,7 +14,8 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from database.db_manager import db_manager
+from dashboard._db import get_engine, read_frame, copy_csv, DATA_TTL, MAX_CACHE_ENTRIES
+from dashboard._charts import downsample, MAX_LINE_POINTS
 
 st.set_page_config(page_title="Data Explorer", page_icon="🔍", layout="wide")
 
@@ -30,55 +32,190 @@ date_range = st.sidebar.date_input(
 )
 
 # Store and department filters
-@st.cache_data
+# Options are tiny and identical for every session: cache_resource shares one
+# immutable copy process-wide (no per-rerun unpickling), refreshed daily
+@st.cache_resource(ttl=DATA_TTL, show_spinner=False)
 def load_filter_options():
-    engine = db_manager.connect()
-    stores = pd.read_sql("SELECT DISTINCT store_id FROM stores ORDER BY store_id", engine)
-    depts = pd.read_sql("SELECT DISTINCT dept_id FROM raw_sales ORDER BY dept_id LIMIT 50", engine)
-    db_manager.close()
-    return stores['store_id'].tolist(), depts['dept_id'].tolist()
+    engine = get_engine()
+    # One roundtrip: both option lists come back as arrays in a single row
+    options = pd.read_sql("""
+        SELECT
+            (SELECT array_agg(DISTINCT store_id ORDER BY store_id) FROM stores) AS stores,
+            (SELECT array_agg(dept_id ORDER BY dept_id) FROM (
+                SELECT DISTINCT dept_id FROM raw_sales ORDER BY dept_id LIMIT 50
+            ) d) AS depts
+    """, engine).iloc[0]
+    return tuple(options['stores'] or ()), tuple(options['depts'] or ())
 
 stores, depts = load_filter_options()
 
 selected_stores = st.sidebar.multiselect("Stores", stores, default=stores[:5])
 selected_depts = st.sidebar.multiselect("Departments", depts, default=depts[:5])
 
+RAW_COLS = [
+    'feature_date', 'store_id', 'dept_id', 'weekly_sales', 'is_holiday',
+    'temperature', 'fuel_price', 'cpi', 'unemployment'
+]
+CORR_COLS = ['weekly_sales', 'temperature', 'fuel_price', 'cpi', 'unemployment']
+
+
+def _explorer_filters(start_date, end_date, store_list, dept_list):
+    """WHERE clause and bound parameters for the sidebar filters"""
+    where_clause = """
+        WHERE feature_date BETWEEN :start_date AND :end_date
+          AND store_id = ANY(:store_ids)
+          AND dept_id = ANY(:dept_ids)
+    """
+    params = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'store_ids': list(store_list),
+        'dept_ids': list(dept_list),
+    }
+    return where_clause, params
+
+
+def _sales_data_query(where_clause):
+    """Latest 10,000 raw rows matching the filters"""
+    return f"""
+        SELECT {', '.join(RAW_COLS)}
+        FROM engineered_features
+        {where_clause}
+        ORDER BY feature_date DESC
+        LIMIT 10000
+    """
+
+
 # Load data
 @st.cache_data(ttl=300)
 def load_sales_data(start_date, end_date, store_list, dept_list):
-    engine = db_manager.connect()
+    # Store/dept lists are bound as arrays (= ANY), never interpolated, so the
+    # statement text is identical on every call
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
     
-    # Build query with filters
-    store_filter = f"AND store_id IN ({','.join(map(str, store_list))})" if store_list else ""
-    dept_filter = f"AND dept_id IN ({','.join(map(str, dept_list))})" if dept_list else ""
+    df = read_frame(_sales_data_query(where_clause), params)
     
+    return df
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_sales_csv(start_date, end_date, store_list, dept_list):
+    """The load_sales_data rows as CSV bytes, formatted by Postgres via COPY"""
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
+    return copy_csv(_sales_data_query(where_clause), params)
+
+
+# Aggregate loaders: Postgres does the GROUP BY, so each chart fetches only the
+# rows it draws, computed over every matching record rather than a LIMIT sample
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_summary(start_date, end_date, store_list, dept_list):
+    """Record count, sales total/average and week count for the summary metrics"""
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
     query = f"""
-        SELECT 
+        SELECT
+            COUNT(*) AS records,
+            COALESCE(SUM(weekly_sales), 0) AS total_sales,
+            COALESCE(AVG(weekly_sales), 0) AS avg_sales,
+            COUNT(DISTINCT feature_date) AS weeks
+        FROM engineered_features
+        {where_clause}
+    """
+    return read_frame(query, params).iloc[0]
+
+
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_time_series(start_date, end_date, store_list, dept_list):
+    """Weekly sales totals, plus the holiday-row total for holiday weeks"""
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
+    query = f"""
+        SELECT
             feature_date,
-            store_id,
-            dept_id,
-            weekly_sales,
-            is_holiday,
-            temperature,
-            fuel_price,
-            cpi,
-            unemployment
+            SUM(weekly_sales) AS weekly_sales,
+            SUM(weekly_sales) FILTER (WHERE is_holiday) AS holiday_sales
+        FROM engineered_features
+        {where_clause}
+        GROUP BY feature_date
+        ORDER BY feature_date
+    """
+    return read_frame(query, params)
+
+
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_store_series(start_date, end_date, store_list, dept_list):
+    """Weekly sales totals per store"""
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
+    query = f"""
+        SELECT feature_date, store_id, SUM(weekly_sales) AS weekly_sales
         FROM engineered_features
-        WHERE feature_date BETWEEN '{start_date}' AND '{end_date}'
-        {store_filter}
-        {dept_filter}
+        {where_clause}
+        GROUP BY feature_date, store_id
+        ORDER BY feature_date, store_id
+    """
+    return read_frame(query, params)
+
+
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_heatmap(start_date, end_date, store_list, dept_list):
+    """Average weekly sales per store/department pair"""
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
+    query = f"""
+        SELECT store_id, dept_id, AVG(weekly_sales) AS weekly_sales
+        FROM engineered_features
+        {where_clause}
+        GROUP BY store_id, dept_id
+    """
+    return read_frame(query, params)
+
+
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def load_corr(start_date, end_date, store_list, dept_list):
+    """Pearson correlation matrix of CORR_COLS, computed by Postgres corr()"""
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
+    pairs = list(combinations(CORR_COLS, 2))
+    select_list = ",\n            ".join(
+        f"corr({a}, {b}) AS {a}__{b}" for a, b in pairs
+    )
+    query = f"""
+        SELECT
+            {select_list}
+        FROM engineered_features
+        {where_clause}
+    """
+    row = read_frame(query, params).iloc[0]
+
+    corr = pd.DataFrame(1.0, index=CORR_COLS, columns=CORR_COLS)
+    for a, b in pairs:
+        corr.loc[a, b] = corr.loc[b, a] = row[f"{a}__{b}"]
+    return corr
+
+
+@st.cache_data(ttl=DATA_TTL, max_entries=MAX_CACHE_ENTRIES, show_spinner=False)
+def search_sales_data(start_date, end_date, store_list, dept_list, search, limit):
+    """Latest rows where any column's text contains search (case-insensitive)"""
+    where_clause, params = _explorer_filters(start_date, end_date, store_list, dept_list)
+
+    # Match the term literally: escape ILIKE's wildcard and escape characters
+    escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    params.update(pattern=f"%{escaped}%", limit=limit)
+    match = " OR ".join(f"CAST({col} AS TEXT) ILIKE :pattern" for col in RAW_COLS)
+
+    query = f"""
+        SELECT {', '.join(RAW_COLS)}
+        FROM engineered_features
+        {where_clause}
+          AND ({match})
         ORDER BY feature_date DESC
-        LIMIT 10000
+        LIMIT :limit
     """
-    
-    df = pd.read_sql(query, engine)
-    db_manager.close()
-    
-    return df
+    return read_frame(query, params)
+
 
 if selected_stores and selected_depts:
+    # Tuples: immutable, stable cache keys for every loader below
+    filters = (date_range[0], date_range[1], tuple(selected_stores), tuple(selected_depts))
     with st.spinner("Loading data..."):
-        data = load_sales_data(date_range[0], date_range[1], selected_stores, selected_depts)
+        summary = load_summary(*filters)
+        data = load_sales_data(*filters)
     
     # Summary statistics
     st.markdown("### 📊 Data Summary")
@@ -86,16 +223,16 @@ if selected_stores and selected_depts:
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Records", f"{len(data):,}")
+        st.metric("Total Records", f"{int(summary['records']):,}")
     
     with col2:
-        st.metric("Total Sales", f"${data['weekly_sales'].sum():,.2f}")
+        st.metric("Total Sales", f"${summary['total_sales']:,.2f}")
     
     with col3:
-        st.metric("Avg Weekly Sales", f"${data['weekly_sales'].mean():,.2f}")
+        st.metric("Avg Weekly Sales", f"${summary['avg_sales']:,.2f}")
     
     with col4:
-        st.metric("Date Range", f"{len(data['feature_date'].unique())} weeks")
+        st.metric("Date Range", f"{int(summary['weeks'])} weeks")
     
     st.markdown("---")
     
@@ -105,22 +242,23 @@ if selected_stores and selected_depts:
     with tab1:
         st.markdown("### Sales Over Time")
         
-        # Aggregate by date
-        time_series = data.groupby('feature_date')['weekly_sales'].sum().reset_index()
+        time_series = load_time_series(*filters)
         
+        # LTTB-downsample the line so the browser never gets more than ~2000 points
         fig = px.line(
-            time_series,
+            downsample(time_series, 'feature_date', 'weekly_sales'),
             x='feature_date',
             y='weekly_sales',
             title='Total Weekly Sales Over Time',
-            labels={'feature_date': 'Date', 'weekly_sales': 'Total Sales ($)'}
+            labels={'feature_date': 'Date', 'weekly_sales': 'Total Sales ($)'},
+            render_mode='webgl'
         )
         
         # Add holiday markers
-        holiday_data = data[data['is_holiday'] == True].groupby('feature_date')['weekly_sales'].sum().reset_index()
-        fig.add_trace(go.Scatter(
+        holiday_data = time_series.dropna(subset=['holiday_sales'])
+        fig.add_trace(go.Scattergl(
             x=holiday_data['feature_date'],
-            y=holiday_data['weekly_sales'],
+            y=holiday_data['holiday_sales'],
             mode='markers',
             name='Holiday Week',
             marker=dict(size=12, color='red', symbol='star')
@@ -131,7 +269,16 @@ if selected_stores and selected_depts:
         
         # By store
         st.markdown("#### Sales by Store")
-        store_series = data.groupby(['feature_date', 'store_id'])['weekly_sales'].sum().reset_index()
+        store_series = load_store_series(*filters)
+        
+        # Split the point budget across stores and downsample each line on its own
+        if len(store_series) > MAX_LINE_POINTS:
+            per_store = max(MAX_LINE_POINTS // store_series['store_id'].nunique(), 3)
+            store_series = pd.concat(
+                [downsample(g, 'feature_date', 'weekly_sales', n_out=per_store)
+                 for _, g in store_series.groupby('store_id', sort=False)],
+                ignore_index=True
+            )
         
         fig2 = px.line(
             store_series,
@@ -139,7 +286,8 @@ if selected_stores and selected_depts:
             y='weekly_sales',
             color='store_id',
             title='Weekly Sales by Store',
-            labels={'feature_date': 'Date', 'weekly_sales': 'Sales ($)', 'store_id': 'Store'}
+            labels={'feature_date': 'Date', 'weekly_sales': 'Sales ($)', 'store_id': 'Store'},
+            render_mode='webgl'
         )
         
         fig2.update_layout(height=500, template='plotly_white')
@@ -188,7 +336,7 @@ if selected_stores and selected_depts:
         st.markdown("### Sales Heatmap")
         
         # Create pivot table
-        pivot_data = data.groupby(['store_id', 'dept_id'])['weekly_sales'].mean().reset_index()
+        pivot_data = load_heatmap(*filters)
         pivot_table = pivot_data.pivot(index='dept_id', columns='store_id', values='weekly_sales')
         
         fig6 = px.imshow(
@@ -213,20 +361,19 @@ if selected_stores and selected_depts:
         with col2:
             rows_to_show = st.selectbox("Rows", [10, 25, 50, 100], index=1)
         
-        # Filter data
-        display_data = data.copy()
+        # Filter data (search runs in Postgres and returns only the rows shown)
         if search:
-            display_data = display_data[
-                display_data.astype(str).apply(lambda x: x.str.contains(search, case=False)).any(axis=1)
-            ]
+            display_data = search_sales_data(*filters, search, rows_to_show)
+        else:
+            display_data = data.head(rows_to_show).copy()
         
         # Format for display
         display_data['weekly_sales'] = display_data['weekly_sales'].apply(lambda x: f"${x:,.2f}")
         
-        st.dataframe(display_data.head(rows_to_show), use_container_width=True, height=400)
+        st.dataframe(display_data, use_container_width=True, height=400)
         
         # Download button
-        csv = data.to_csv(index=False)
+        csv = load_sales_csv(*filters)
         st.download_button(
             label="📥 Download Full Dataset CSV",
             data=csv,
@@ -239,8 +386,7 @@ if selected_stores and selected_depts:
     # Correlation analysis
     st.markdown("### 🔗 Correlation Analysis")
     
-    numeric_cols = ['weekly_sales', 'temperature', 'fuel_price', 'cpi', 'unemployment']
-    corr_data = data[numeric_cols].corr()
+    corr_data = load_corr(*filters)
     
     fig7 = px.imshow(
         corr_data,
@@ -9,6 +9,112 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    # Optional: compiled, multi-threaded rolling statistics
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+# Lags and rolling windows produced by engineer_features
+PIPELINE_LAGS = [1, 2, 4, 8, 52]
+PIPELINE_WINDOWS = [4, 13, 52]
+
+# dtypes for reading engineered_features back from the database. DECIMAL
+# features load as float32 (LightGBM bins them in float32 anyway, so this
+# halves memory for free); the weekly_sales target keeps float64 cents.
+ENGINEERED_DTYPES = {
+    'store_id': 'int16',
+    'dept_id': 'int16',
+    **{col: 'float32' for col in [
+        'sales_lag_1', 'sales_lag_2', 'sales_lag_4', 'sales_lag_8', 'sales_lag_52',
+        'rolling_mean_4', 'rolling_mean_13', 'rolling_mean_52',
+        'rolling_std_4', 'rolling_std_13', 'rolling_min_4', 'rolling_max_4',
+        'temperature', 'temperature_deviation', 'fuel_price', 'fuel_price_change',
+        'cpi', 'cpi_change', 'unemployment', 'unemployment_change',
+        'total_markdown', 'size_normalized',
+    ]},
+}
+
+
+def _series_stats_kernel(values, group_start, lags, windows,
+                         out_lags, out_mean, out_std, out_min, out_max):
+    """
+    Lags plus trailing-window mean/std/min/max for every row, in one sweep
+    
+    Row i's lag k is values[i - lags[k]] and its window k covers the last
+    windows[k] rows, both clipped at group_start[i], the first row of its
+    store/dept group. Window stats follow pandas rolling (min_periods=1,
+    ddof=1, NaNs skipped). Rows are independent, so the outer loop is a
+    prange, and each row's short history is read once for every output.
+    """
+    for i in prange(len(values)):
+        g = group_start[i]
+        for k in range(len(lags)):
+            j = i - lags[k]
+            out_lags[i, k] = values[j] if g <= j <= i else np.nan
+        
+        for k in range(len(windows)):
+            start = max(g, i - windows[k] + 1)
+            count = 0
+            total = 0.0
+            lo = np.inf
+            hi = -np.inf
+            for j in range(start, i + 1):
+                v = values[j]
+                if not np.isnan(v):
+                    count += 1
+                    total += v
+                    lo = min(lo, v)
+                    hi = max(hi, v)
+            if count == 0:
+                out_mean[i, k] = out_std[i, k] = out_min[i, k] = out_max[i, k] = np.nan
+                continue
+            mean = total / count
+            sq = 0.0
+            for j in range(start, i + 1):
+                v = values[j]
+                if not np.isnan(v):
+                    sq += (v - mean) * (v - mean)
+            out_mean[i, k] = mean
+            out_std[i, k] = np.sqrt(sq / (count - 1)) if count > 1 else np.nan
+            out_min[i, k] = lo
+            out_max[i, k] = hi
+
+
+_series_stats = (
+    njit(parallel=True, cache=True)(_series_stats_kernel) if njit is not None else None
+)
+
+
+def _group_row_starts(df):
+    """Index of the first row of each row's store/dept group (df sorted by them)"""
+    codes = df.groupby(['store_id', 'dept_id'], sort=False).ngroup().to_numpy()
+    is_start = np.ones(len(codes), dtype=bool)
+    is_start[1:] = codes[1:] != codes[:-1]
+    return np.maximum.accumulate(np.where(is_start, np.arange(len(codes)), 0))
+
+
+def _add_series_features(df, lags, windows, target_col):
+    """Run _series_stats over sorted df and add its lag and rolling columns"""
+    values = df[target_col].to_numpy(dtype=np.float64)
+    n = len(values)
+    lags = np.asarray(lags, dtype=np.int64)
+    windows = np.asarray(windows, dtype=np.int64)
+    out_lags = np.empty((n, len(lags)))
+    out = {stat: np.empty((n, len(windows))) for stat in ['mean', 'std', 'min', 'max']}
+    _series_stats(values, _group_row_starts(df), lags, windows,
+                  out_lags, out['mean'], out['std'], out['min'], out['max'])
+    
+    for k, lag in enumerate(lags):
+        df[f'sales_lag_{lag}'] = out_lags[:, k]
+    for k, window in enumerate(windows):
+        # Additional stats for 4-week window
+        stats = ['mean', 'std', 'min', 'max'] if window == 4 else ['mean', 'std']
+        for stat in stats:
+            df[f'rolling_{stat}_{window}'] = out[stat][:, k]
+    return df
+
 
 def create_temporal_features(df):
     """
@@ -20,14 +126,27 @@ def create_temporal_features(df):
     Returns:
         DataFrame with additional temporal features
     """
-    df = df.copy()
+    # Shallow copy: new columns (and the replaced date column) land in the
+    # copy's column set without duplicating the caller's data
+    df = df.copy(deep=False)
     df['date'] = pd.to_datetime(df['date'])
     
-    df['week_of_year'] = df['date'].dt.isocalendar().week
-    df['month'] = df['date'].dt.month
-    df['quarter'] = df['date'].dt.quarter
-    df['is_month_start'] = df['date'].dt.is_month_start
-    df['is_month_end'] = df['date'].dt.is_month_end
+    # Derive every field from one day-resolution view of the column using
+    # datetime64 unit casts, instead of five separate .dt accessor passes
+    days = df['date'].to_numpy(dtype='datetime64[D]')
+    month_starts = days.astype('datetime64[M]')
+    month = month_starts.astype(np.int64) % 12 + 1
+    
+    # ISO week: the week containing a date's Thursday belongs to that Thursday's year
+    weekday = (days.astype(np.int64) + 3) % 7  # Monday=0; 1970-01-01 was a Thursday
+    thursdays = days - weekday + 3
+    iso_year_starts = thursdays.astype('datetime64[Y]').astype('datetime64[D]')
+    
+    df['week_of_year'] = ((thursdays - iso_year_starts).astype(np.int64) // 7 + 1).astype(np.int32)
+    df['month'] = month.astype(np.int32)
+    df['quarter'] = ((month - 1) // 3 + 1).astype(np.int32)
+    df['is_month_start'] = days == month_starts
+    df['is_month_end'] = (days + 1).astype('datetime64[M]') != month_starts
     
     logger.info("✓ Created temporal features")
     return df
@@ -45,13 +164,21 @@ def create_lag_features(df, lags=[1, 2, 4, 8, 52], target_col='weekly_sales'):
     Returns:
         DataFrame with lag features
     """
-    df = df.copy()
-    
     # Sort to ensure proper lag calculation
     df = df.sort_values(['store_id', 'dept_id', 'date'])
     
+    # Rows are contiguous per store/dept after the sort, so a lag of n stays
+    # inside its group exactly when the row n positions back has the same code.
+    # One grouper pass, then every lag is a slice of the same float64 buffer.
+    codes = df.groupby(['store_id', 'dept_id'], sort=False).ngroup().to_numpy()
+    values = df[target_col].to_numpy(dtype=np.float64)
+    
     for lag in lags:
-        df[f'sales_lag_{lag}'] = df.groupby(['store_id', 'dept_id'])[target_col].shift(lag)
+        lagged = np.full(len(values), np.nan)
+        if 0 < lag < len(values):
+            same_group = codes[lag:] == codes[:-lag]
+            lagged[lag:] = np.where(same_group, values[:-lag], np.nan)
+        df[f'sales_lag_{lag}'] = lagged
     
     logger.info(f"✓ Created {len(lags)} lag features")
     return df
@@ -69,35 +196,63 @@ def create_rolling_features(df, windows=[4, 13, 52], target_col='weekly_sales'):
     Returns:
         DataFrame with rolling features
     """
-    df = df.copy()
-    
     # Sort to ensure proper rolling calculation
     df = df.sort_values(['store_id', 'dept_id', 'date'])
     
+    if _series_stats is not None:
+        df = _add_series_features(df, [], windows, target_col)
+        logger.info(f"✓ Created rolling features for {len(windows)} windows")
+        return df
+    
+    # One grouper for every window; groupby.rolling dispatches straight into the
+    # Cython window kernels instead of building a rolling object per group.
+    # sort=True returns groups in key order, which is the frame's row order;
+    # sort=False orders multi-key groups by per-key first appearance instead.
+    grouped = df.groupby(['store_id', 'dept_id'], sort=True)[target_col]
+    
     for window in windows:
-        # Rolling mean
-        df[f'rolling_mean_{window}'] = df.groupby(['store_id', 'dept_id'])[target_col].transform(
-            lambda x: x.rolling(window=window, min_periods=1).mean()
-        )
-        
-        # Rolling std
-        df[f'rolling_std_{window}'] = df.groupby(['store_id', 'dept_id'])[target_col].transform(
-            lambda x: x.rolling(window=window, min_periods=1).std()
-        )
-        
         # Additional stats for 4-week window
-        if window == 4:
-            df[f'rolling_min_{window}'] = df.groupby(['store_id', 'dept_id'])[target_col].transform(
-                lambda x: x.rolling(window=window, min_periods=1).min()
-            )
-            df[f'rolling_max_{window}'] = df.groupby(['store_id', 'dept_id'])[target_col].transform(
-                lambda x: x.rolling(window=window, min_periods=1).max()
-            )
+        stats = ['mean', 'std', 'min', 'max'] if window == 4 else ['mean', 'std']
+        rolled = grouped.rolling(window=window, min_periods=1).agg(stats)
+        
+        # df is sorted by store/dept/date, so sorted groups come back in row order
+        for stat in stats:
+            df[f'rolling_{stat}_{window}'] = rolled[stat].to_numpy()
     
     logger.info(f"✓ Created rolling features for {len(windows)} windows")
     return df
 
 
+def create_series_features(df, lags=PIPELINE_LAGS, windows=PIPELINE_WINDOWS,
+                           target_col='weekly_sales'):
+    """
+    Create lag and rolling features together
+    
+    With numba installed both come out of one compiled sweep over the sorted
+    sales column; otherwise this is create_lag_features followed by
+    create_rolling_features. Columns are identical either way.
+    
+    Args:
+        df: DataFrame with store_id, dept_id, date and target_col
+        lags: List of lag periods (in weeks)
+        windows: List of window sizes (in weeks)
+        target_col: Column to create features for
+    
+    Returns:
+        DataFrame with lag and rolling features
+    """
+    if _series_stats is None:
+        df = create_lag_features(df, lags=lags, target_col=target_col)
+        return create_rolling_features(df, windows=windows, target_col=target_col)
+    
+    df = df.sort_values(['store_id', 'dept_id', 'date'])
+    df = _add_series_features(df, lags, windows, target_col)
+    
+    logger.info(f"✓ Created {len(lags)} lag features and rolling features "
+                f"for {len(windows)} windows")
+    return df
+
+
 def create_economic_features(df):
     """
     Create features from economic indicators
@@ -108,30 +263,31 @@ def create_economic_features(df):
     Returns:
         DataFrame with economic features
     """
-    df = df.copy()
-    
     # Sort for proper shift calculations
     df = df.sort_values(['store_id', 'date'])
     
-    # Temperature deviation from mean
-    df['temperature_deviation'] = df.groupby('store_id')['temperature'].transform(
-        lambda x: x - x.mean()
-    )
-    
-    # Fuel price change
-    df['fuel_price_change'] = df.groupby('store_id')['fuel_price'].transform(
-        lambda x: x.diff()
-    )
-    
-    # CPI change
-    df['cpi_change'] = df.groupby('store_id')['cpi'].transform(
-        lambda x: x.diff()
-    )
-    
-    # Unemployment change
-    df['unemployment_change'] = df.groupby('store_id')['unemployment'].transform(
-        lambda x: x.diff()
-    )
+    # Rows are contiguous per store after the sort: one set of group codes
+    # serves the per-store mean and all three diffs
+    codes, _ = pd.factorize(df['store_id'])
+    new_store = np.ones(len(codes), dtype=bool)
+    new_store[1:] = codes[1:] != codes[:-1]
+    
+    # Temperature deviation from mean (NaN-skipping per-store mean)
+    temperature = df['temperature'].to_numpy(dtype=np.float64)
+    observed = ~np.isnan(temperature)
+    sums = np.bincount(codes, weights=np.where(observed, temperature, 0.0))
+    counts = np.bincount(codes, weights=observed)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        store_mean = sums / counts
+    df['temperature_deviation'] = temperature - store_mean[codes]
+    
+    # Fuel price, CPI and unemployment change since the store's previous row
+    for col in ['fuel_price', 'cpi', 'unemployment']:
+        values = df[col].to_numpy(dtype=np.float64)
+        change = np.empty_like(values)
+        change[1:] = values[1:] - values[:-1]
+        change[new_store] = np.nan
+        df[f'{col}_change'] = change
     
     logger.info("✓ Created economic indicator features")
     return df
@@ -147,23 +303,23 @@ def create_markdown_features(df):
     Returns:
         DataFrame with markdown features
     """
-    df = df.copy()
+    df = df.copy(deep=False)
     
     markdown_cols = ['markdown1', 'markdown2', 'markdown3', 'markdown4', 'markdown5']
     
-    # Fill NaN with 0 for markdowns
-    for col in markdown_cols:
-        if col in df.columns:
-            df[col] = df[col].fillna(0)
+    # Fill NaN with 0 for markdowns: one (n, 5) array, written back in one go
+    markdowns = np.nan_to_num(df[markdown_cols].to_numpy(dtype=np.float64), nan=0.0)
+    df[markdown_cols] = markdowns
     
     # Total markdown
-    df['total_markdown'] = df[markdown_cols].sum(axis=1)
+    total = markdowns.sum(axis=1)
+    df['total_markdown'] = total
     
     # Has markdown flag
-    df['has_markdown'] = (df['total_markdown'] > 0).astype(int)
+    df['has_markdown'] = (total > 0).astype(int)
     
     # Count of active markdowns
-    df['markdown_count'] = (df[markdown_cols] > 0).sum(axis=1)
+    df['markdown_count'] = (markdowns > 0).sum(axis=1)
     
     logger.info("✓ Created markdown features")
     return df
@@ -180,8 +336,6 @@ def create_store_features(df, stores_df):
     Returns:
         DataFrame with store features
     """
-    df = df.copy()
-    
     # Merge store info
     df = df.merge(stores_df[['store_id', 'store_type', 'size']], on='store_id', how='left')
     
@@ -232,11 +386,8 @@ def engineer_features(sales_df, features_df, stores_df):
     # 1. Temporal features
     df = create_temporal_features(df)
     
-    # 2. Lag features
-    df = create_lag_features(df, lags=[1, 2, 4, 8, 52])
-    
-    # 3. Rolling features
-    df = create_rolling_features(df, windows=[4, 13, 52])
+    # 2-3. Lag and rolling features
+    df = create_series_features(df, lags=PIPELINE_LAGS, windows=PIPELINE_WINDOWS)
     
     # 4. Economic features
     df = create_economic_features(df)
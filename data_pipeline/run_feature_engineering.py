@@ -17,6 +17,12 @@ from database.db_manager import db_manager
 from data_pipeline.feature_engineering import engineer_features
 from dotenv import load_dotenv
 
+try:
+    # Optional: columnar snapshot of the engineered features
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
 load_dotenv()
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +31,14 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Narrow dtypes for the join keys and flags: 45 stores and ~100 departments fit
+# in int16, which shrinks every merge/groupby/sort key pass. Sales, markdowns and
+# CPI stay float64 -- float32 cannot hold DECIMAL(12,2) values to the cent.
+SALES_DTYPES = {'store_id': 'int16', 'dept_id': 'int16', 'is_holiday': 'bool'}
+FEATURES_DTYPES = {'store_id': 'int16', 'is_holiday': 'bool'}
+STORES_DTYPES = {'store_id': 'int16', 'size': 'int32'}
+
+
 def load_data_from_db():
     """Load raw data from database"""
     logger.info("Loading data from database...")
@@ -36,7 +50,8 @@ def load_data_from_db():
         SELECT store_id, dept_id, date, weekly_sales, is_holiday
         FROM raw_sales
         ORDER BY store_id, dept_id, date
-    """, engine)
+    """, engine, parse_dates=['date'])
+    sales_df = sales_df.astype(SALES_DTYPES)
     logger.info(f"  Loaded {len(sales_df):,} sales records")
     
     # Load features
@@ -46,7 +61,8 @@ def load_data_from_db():
                cpi, unemployment, is_holiday
         FROM features
         ORDER BY store_id, date
-    """, engine)
+    """, engine, parse_dates=['date'])
+    features_df = features_df.astype(FEATURES_DTYPES)
     logger.info(f"  Loaded {len(features_df):,} feature records")
     
     # Load stores
@@ -55,6 +71,7 @@ def load_data_from_db():
         FROM stores
         ORDER BY store_id
     """, engine)
+    stores_df = stores_df.astype(STORES_DTYPES)
     logger.info(f"  Loaded {len(stores_df)} stores")
     
     return sales_df, features_df, stores_df
@@ -93,17 +110,37 @@ def write_features_to_db(features_df):
         if col in features_df.columns:
             features_df[col] = features_df[col].astype(bool)
     
-    # Write to database in chunks
-    engine = db_manager.connect()
-    chunk_size = 10000
-    
+    # Bulk-load with COPY (far cheaper than multi-row INSERTs)
     with tqdm(total=len(features_df), desc="  Writing features") as pbar:
-        for i in range(0, len(features_df), chunk_size):
-            chunk = features_df.iloc[i:i+chunk_size]
-            chunk.to_sql('engineered_features', engine, if_exists='append', index=False)
-            pbar.update(len(chunk))
+        db_manager.copy_dataframe(features_df, 'engineered_features', on_chunk=pbar.update)
     
     logger.info(f"✓ Wrote {len(features_df):,} feature records to database")
+    return features_df
+
+
+# zstd-compressed Parquet copy of engineered_features, next to the source CSVs
+FEATURES_PARQUET = project_root / 'data' / 'engineered_features.parquet'
+
+
+def write_features_to_parquet(features_df, path=FEATURES_PARQUET):
+    """
+    Write engineered features to a Parquet snapshot
+    
+    Same rows and columns as the engineered_features table, stored column-wise
+    with zstd compression so bulk scans (DuckDB, pandas, Arrow) read only the
+    columns and row groups they need.
+    """
+    if pyarrow is None:
+        logger.info("  pyarrow not installed, skipping Parquet snapshot")
+        return None
+    
+    logger.info("Writing engineered features to Parquet...")
+    features_df.to_parquet(
+        path, engine='pyarrow', index=False,
+        compression='zstd', row_group_size=50_000
+    )
+    logger.info(f"✓ Wrote {len(features_df):,} feature records to {path}")
+    return path
 
 
 def verify_features():
@@ -157,7 +194,8 @@ def main():
         
         # Step 3: Write to database
         logger.info("\n[3/4] Writing to database...")
-        write_features_to_db(engineered_df)
+        stored_df = write_features_to_db(engineered_df)
+        write_features_to_parquet(stored_df)
         
         # Step 4: Verify
         logger.info("\n[4/4] Verifying features...")
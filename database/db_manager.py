@@ -1,8 +1,11 @@
 """
 Database Manager - Connection and utility functions
 """
+import io
 import os
 import logging
+import pandas as pd
+from psycopg2 import sql
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
@@ -24,6 +27,16 @@ class DatabaseManager:
             'user': os.getenv('DB_USER', 'postgres'),
             'password': os.getenv('DB_PASSWORD', '')
         }
+        # Pool settings; set DB_POOL_PRE_PING=false behind PgBouncer in
+        # transaction mode, where the ping holds a server connection open
+        self.pool_config = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '60')),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+        }
+        self.statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '60000'))
         self.engine = None
         self.Session = None
     
@@ -50,12 +63,18 @@ class DatabaseManager:
             with engine.connect() as conn:
                 # Check if database exists
                 result = conn.execute(
-                    text(f"SELECT 1 FROM pg_database WHERE datname = '{self.db_config['database']}'")
+                    text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                    {'name': self.db_config['database']}
                 )
                 exists = result.fetchone()
                 
                 if not exists:
-                    conn.execute(text(f"CREATE DATABASE {self.db_config['database']}"))
+                    # Identifiers can't be bound parameters; quote the name instead
+                    create = sql.SQL("CREATE DATABASE {}").format(
+                        sql.Identifier(self.db_config['database'])
+                    )
+                    with conn.connection.cursor() as cur:
+                        cur.execute(create)
                     logger.info(f"✓ Created database: {self.db_config['database']}")
                 else:
                     logger.info(f"✓ Database already exists: {self.db_config['database']}")
@@ -70,9 +89,8 @@ class DatabaseManager:
         if self.engine is None:
             self.engine = create_engine(
                 self.get_connection_string(),
-                pool_pre_ping=True,
-                pool_size=5,
-                max_overflow=10
+                connect_args={'options': f'-c statement_timeout={self.statement_timeout_ms}'},
+                **self.pool_config
             )
             self.Session = sessionmaker(bind=self.engine)
             logger.info("✓ Database connection established")
@@ -86,17 +104,96 @@ class DatabaseManager:
         with open(schema_file, 'r') as f:
             schema_sql = f.read()
         
+        # Send the whole script in one round-trip and one transaction; no
+        # splitting on ';', which would break DO blocks and function bodies
         engine = self.connect()
-        with engine.connect() as conn:
-            # Execute schema (split by semicolon for multiple statements)
-            for statement in schema_sql.split(';'):
-                statement = statement.strip()
-                if statement:
-                    conn.execute(text(statement))
-            conn.commit()
+        with engine.begin() as conn:
+            # no_parameters: hand the script to the driver as-is (no % escaping)
+            conn.exec_driver_sql(schema_sql, execution_options={'no_parameters': True})
         
         logger.info(f"✓ Schema executed from: {schema_file}")
     
+    def copy_dataframe(self, df, table, chunk_size=50000, on_chunk=None,
+                       truncate=False, engine=None):
+        """
+        Bulk-load a DataFrame with COPY ... FROM STDIN in a single transaction
+        
+        Secondary indexes on the table are dropped for the load and rebuilt
+        once at the end, which is cheaper than maintaining them row by row.
+        Constraint-backed indexes (primary/unique keys) are left in place.
+        
+        Args:
+            df: DataFrame whose columns match the target table's column names
+            table: Target table name
+            chunk_size: Rows serialized to CSV per COPY round-trip
+            on_chunk: Optional callback receiving the row count of each chunk
+            truncate: Empty the table (TRUNCATE ... RESTART IDENTITY) in the
+                same transaction before loading
+            engine: Engine to write to (defaults to this manager's engine)
+        
+        Returns:
+            Number of rows copied
+        """
+        columns = ', '.join(df.columns)
+        copy_sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        
+        raw_conn = (engine or self.connect()).raw_connection()
+        try:
+            with raw_conn.cursor() as cur:
+                if truncate:
+                    cur.execute(f"TRUNCATE {table} RESTART IDENTITY")
+                
+                cur.execute("""
+                    SELECT indexname, indexdef FROM pg_indexes
+                    WHERE tablename = %s
+                      AND indexname NOT IN (SELECT conname FROM pg_constraint)
+                """, (table,))
+                indexes = cur.fetchall()
+                for name, _ in indexes:
+                    cur.execute(f"DROP INDEX {name}")
+                
+                for i in range(0, len(df), chunk_size):
+                    chunk = df.iloc[i:i+chunk_size]
+                    buf = io.StringIO()
+                    chunk.to_csv(buf, index=False, header=False)
+                    buf.seek(0)
+                    cur.copy_expert(copy_sql, buf)
+                    if on_chunk is not None:
+                        on_chunk(len(chunk))
+                
+                for _, indexdef in indexes:
+                    cur.execute(indexdef)
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+        
+        return len(df)
+    
+    def read_dataframe(self, query, params=None, dtype=None, chunk_size=50000, engine=None):
+        """
+        Stream a query result into a DataFrame through a server-side cursor
+        
+        Rows are fetched chunk_size at a time and converted chunk by chunk,
+        so the driver never buffers the full result set next to the frame.
+        
+        Args:
+            query: SQL SELECT text with :name placeholders
+            params: Bound parameter values
+            dtype: Optional column -> dtype mapping applied to each chunk
+            chunk_size: Rows fetched and converted per round-trip
+            engine: Engine to read from (defaults to this manager's engine)
+        
+        Returns:
+            Query result as a DataFrame
+        """
+        engine = engine or self.connect()
+        with engine.connect().execution_options(stream_results=True) as conn:
+            chunks = pd.read_sql(text(query), conn, params=params, chunksize=chunk_size, dtype=dtype)
+            return pd.concat(chunks, ignore_index=True)
+    
     def get_session(self):
         """Get a new database session"""
         if self.Session is None:
@@ -141,6 +141,6 @@ CREATE TABLE model_metadata (
 CREATE INDEX idx_raw_sales_store_dept_date ON raw_sales(store_id, dept_id, date);
 CREATE INDEX idx_raw_sales_date ON raw_sales(date);
 CREATE INDEX idx_features_store_date ON features(store_id, date);
-CREATE INDEX idx_engineered_features_store_dept_date ON engineered_features(store_id, dept_id, feature_date);
+CREATE INDEX idx_engineered_features_store_dept_date ON engineered_features(store_id, dept_id, feature_date DESC);
 CREATE INDEX idx_forecasts_store_dept_date ON forecasts(store_id, dept_id, forecast_date);
 CREATE INDEX idx_forecasts_date ON forecasts(forecast_date);
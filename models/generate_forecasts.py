@@ -9,11 +9,16 @@ import numpy as np
 import lightgbm as lgb
 import logging
 from datetime import timedelta
+from functools import lru_cache
 from pathlib import Path
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
+try:
+    # Optional: columnar snapshot of the latest forecasts
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
 load_dotenv()
 
 logging.basicConfig(
@@ -26,23 +31,17 @@ logger = logging.getLogger(__name__)
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-
-def get_db_engine():
-    """Create database engine with URL-encoded password"""
-    password = quote_plus(os.getenv('DB_PASSWORD'))
-    return create_engine(
-        f"postgresql://{os.getenv('DB_USER')}:{password}"
-        f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-    )
+from database.db_manager import db_manager
+from data_pipeline.feature_engineering import ENGINEERED_DTYPES
 
 
-def load_model():
+@lru_cache(maxsize=2)
+def _load_booster(local_path, tracking_uri, model_name):
     """
-    Load trained LightGBM model
-    Tries local file first, then MLflow
-    """
-    local_path = 'models/saved/walmart_forecaster.txt'
+    Load a LightGBM Booster, cached per (path, tracking URI, model name)
 
+    Failed loads raise and are therefore not cached.
+    """
     # Option 1: Load from local file
     if Path(local_path).exists():
         model = lgb.Booster(model_file=local_path)
@@ -52,10 +51,8 @@ def load_model():
     # Option 2: Load from MLflow
     try:
         import mlflow
-        mlflow.set_tracking_uri(os.getenv('MLFLOW_TRACKING_URI'))
+        mlflow.set_tracking_uri(tracking_uri)
 
-        # Try the name used in trainer.py
-        model_name = "walmart_sales_forecaster"
         logger.info(f"Local model not found. Trying MLflow: {model_name}")
 
         # Get latest version
@@ -81,6 +78,25 @@ def load_model():
     )
 
 
+def load_model():
+    """
+    Load trained LightGBM model
+    Tries local file first, then MLflow
+
+    The Booster is cached for the life of the process; call
+    load_model.cache_clear() after retraining to pick up the new model.
+    """
+    # Try the name used in trainer.py
+    return _load_booster(
+        'models/saved/walmart_forecaster.txt',
+        os.getenv('MLFLOW_TRACKING_URI'),
+        'walmart_sales_forecaster'
+    )
+
+
+load_model.cache_clear = _load_booster.cache_clear
+
+
 def load_latest_features(engine):
     """
     Load the most recent features for each store-dept combination
@@ -88,28 +104,26 @@ def load_latest_features(engine):
     """
     logger.info("Loading latest features from database...")
 
+    # One pass over the (store_id, dept_id, feature_date DESC) index
     query = """
-        SELECT *
-        FROM engineered_features ef
-        WHERE feature_date = (
-            SELECT MAX(feature_date)
-            FROM engineered_features ef2
-            WHERE ef2.store_id = ef.store_id
-              AND ef2.dept_id = ef.dept_id
-        )
-        ORDER BY store_id, dept_id
+        SELECT DISTINCT ON (store_id, dept_id) *
+        FROM engineered_features
+        ORDER BY store_id, dept_id, feature_date DESC
     """
 
-    df = pd.read_sql(query, engine)
+    df = db_manager.read_dataframe(query, dtype=ENGINEERED_DTYPES, engine=engine)
     logger.info(f"✅ Loaded features for {len(df)} store-dept combinations")
     logger.info(f"   Latest date in data: {df['feature_date'].max()}")
 
     return df
 
 
+@lru_cache(maxsize=8)
 def get_feature_columns(model):
     """
     Get the feature columns the model expects
+
+    Memoized per model object; callers must not mutate the returned list.
     """
     # LightGBM Booster stores feature names
     if hasattr(model, 'feature_name'):
@@ -120,6 +134,7 @@ def get_feature_columns(model):
     # Fallback: define manually (must match training)
     logger.warning("Could not read feature names from model. Using default list.")
     return [
+        'store_id', 'dept_id',
         'week_of_year', 'month', 'quarter', 'year',
         'day_of_week', 'day_of_month', 'day_of_year',
         'is_month_start', 'is_month_end',
@@ -144,7 +159,8 @@ def generate_predictions(model, features_df, forecast_weeks=8):
     Generate predictions for future weeks
 
     For each store-dept, uses the latest known features as a base
-    and generates predictions for the next N weeks.
+    and generates predictions for the next N weeks. All store-dept x week
+    rows are scored in a single batched model.predict call.
     """
     logger.info(f"Generating {forecast_weeks}-week forecasts...")
 
@@ -152,76 +168,70 @@ def generate_predictions(model, features_df, forecast_weeks=8):
     last_date = pd.to_datetime(features_df['feature_date'].max())
 
     # Generate future dates (weekly)
-    future_dates = [last_date + timedelta(weeks=w) for w in range(1, forecast_weeks + 1)]
+    future_dates = pd.DatetimeIndex(
+        [last_date + timedelta(weeks=w) for w in range(1, forecast_weeks + 1)]
+    )
     logger.info(f"   Forecast dates: {future_dates[0].date()} to {future_dates[-1].date()}")
 
-    all_forecasts = []
-
-    for _, row in features_df.iterrows():
-        store_id = int(row['store_id'])
-        dept_id = int(row['dept_id'])
-
-        for forecast_date in future_dates:
-            # Build feature vector from latest known data
-            # Update time features for the forecast date
-            feature_row = row.copy()
-            feature_row['week_of_year'] = forecast_date.isocalendar()[1]
-            feature_row['month'] = forecast_date.month
-            feature_row['quarter'] = (forecast_date.month - 1) // 3 + 1
-
-            if 'year' in feature_cols:
-                feature_row['year'] = forecast_date.year
-            if 'day_of_week' in feature_cols:
-                feature_row['day_of_week'] = forecast_date.weekday()
-            if 'day_of_month' in feature_cols:
-                feature_row['day_of_month'] = forecast_date.day
-            if 'day_of_year' in feature_cols:
-                feature_row['day_of_year'] = forecast_date.timetuple().tm_yday
-
-            # Update period flags
-            feature_row['is_month_start'] = 1 if forecast_date.day <= 7 else 0
-            feature_row['is_month_end'] = 1 if forecast_date.day >= 24 else 0
-            feature_row['is_quarter_start'] = 1 if forecast_date.month in [1, 4, 7, 10] else 0
-            feature_row['is_quarter_end'] = 1 if forecast_date.month in [3, 6, 9, 12] else 0
-
-            # Extract features in the correct order
-            available = [c for c in feature_cols if c in feature_row.index]
-            missing = [c for c in feature_cols if c not in feature_row.index]
-
-            if missing:
-                logger.warning(f"Missing features (will be 0): {missing[:5]}...")
-
-            X = pd.DataFrame([feature_row[available]])
-
-            # Add missing columns as 0
-            for col in missing:
-                X[col] = 0
-
-            X = X[feature_cols]  # Ensure correct column order
-
-            # Predict
-            pred = model.predict(X)[0]
-            pred = max(pred, 0)  # Sales can't be negative
-
-            # Confidence interval (based on prediction magnitude)
-            # Wider intervals for larger predictions
-            std_estimate = max(pred * 0.15, 100)  # At least $100 uncertainty
-            lower = max(pred - 1.96 * std_estimate, 0)
-            upper = pred + 1.96 * std_estimate
-
-            all_forecasts.append({
-                'store_id': store_id,
-                'dept_id': dept_id,
-                'forecast_date': forecast_date.date(),
-                'predicted_sales': round(float(pred), 2),
-                'prediction_lower': round(float(lower), 2),
-                'prediction_upper': round(float(upper), 2),
-                'model_name': 'lightgbm_forecaster',
-                'model_version': 'v1.0',
-                'confidence_score': round(0.85 - (0.02 * future_dates.index(forecast_date)), 4)
-            })
-
-    forecast_df = pd.DataFrame(all_forecasts)
+    # One row per (store-dept, forecast week), store-dept major like the output
+    n_rows = len(features_df)
+    week_idx = np.tile(np.arange(forecast_weeks), n_rows)
+
+    # Time features and period flags, computed once per forecast date and
+    # broadcast to every store-dept row through week_idx
+    week_features = {
+        'week_of_year': future_dates.isocalendar().week.to_numpy(dtype=np.int64),
+        'month': future_dates.month,
+        'quarter': future_dates.quarter,
+        'year': future_dates.year,
+        'day_of_week': future_dates.dayofweek,
+        'day_of_month': future_dates.day,
+        'day_of_year': future_dates.dayofyear,
+        'is_month_start': future_dates.day <= 7,
+        'is_month_end': future_dates.day >= 24,
+        'is_quarter_start': future_dates.month.isin([1, 4, 7, 10]),
+        'is_quarter_end': future_dates.month.isin([3, 6, 9, 12]),
+    }
+    time_features = {name: np.asarray(values)[week_idx] for name, values in week_features.items()}
+
+    missing = [c for c in feature_cols
+               if c not in features_df.columns and c not in time_features]
+    if missing:
+        logger.warning(f"Missing features (will be 0): {missing[:5]}...")
+
+    # Latest known features in model column order (missing columns as 0),
+    # repeated once per forecast week into a single C-contiguous float32
+    # matrix, the layout LightGBM scores without converting it first
+    base = features_df.reindex(columns=feature_cols, fill_value=0).to_numpy(dtype=np.float32)
+    X = np.repeat(base, forecast_weeks, axis=0)
+
+    # Overwrite the time features for the forecast dates
+    col_idx = {name: i for i, name in enumerate(feature_cols)}
+    for name, values in time_features.items():
+        if name in col_idx:
+            X[:, col_idx[name]] = values
+
+    # Predict
+    pred = model.predict(X, num_threads=os.cpu_count())
+    pred = np.maximum(pred, 0)  # Sales can't be negative
+
+    # Confidence interval (based on prediction magnitude)
+    # Wider intervals for larger predictions
+    std_estimate = np.maximum(pred * 0.15, 100)  # At least $100 uncertainty
+    lower = np.maximum(pred - 1.96 * std_estimate, 0)
+    upper = pred + 1.96 * std_estimate
+
+    forecast_df = pd.DataFrame({
+        'store_id': features_df['store_id'].to_numpy().repeat(forecast_weeks).astype(int),
+        'dept_id': features_df['dept_id'].to_numpy().repeat(forecast_weeks).astype(int),
+        'forecast_date': future_dates.date[week_idx],
+        'predicted_sales': np.round(pred, 2),
+        'prediction_lower': np.round(lower, 2),
+        'prediction_upper': np.round(upper, 2),
+        'model_name': 'lightgbm_forecaster',
+        'model_version': 'v1.0',
+        'confidence_score': np.round(0.85 - 0.02 * week_idx, 4)
+    })
     logger.info(f"✅ Generated {len(forecast_df)} predictions")
     logger.info(f"   Stores: {forecast_df['store_id'].nunique()}")
     logger.info(f"   Departments: {forecast_df['dept_id'].nunique()}")
@@ -231,27 +241,40 @@ def generate_predictions(model, features_df, forecast_weeks=8):
 
 
 def write_forecasts(forecast_df, engine):
-    """Write forecasts to database, replacing any existing ones"""
+    """
+    Write forecasts to database, replacing any existing ones
+
+    The table is truncated and reloaded with COPY in one transaction, so
+    readers see either the old forecasts or the new ones, never neither.
+    """
     logger.info("Writing forecasts to database...")
 
-    # Clear old forecasts
-    from sqlalchemy import text
-    with engine.connect() as conn:
-        conn.execute(text("DELETE FROM forecasts"))
-        conn.commit()
-        logger.info("   Cleared old forecasts")
-
-    # Write new forecasts
-    forecast_df.to_sql(
-        'forecasts',
-        engine,
-        if_exists='append',
-        index=False
-    )
+    db_manager.copy_dataframe(forecast_df, 'forecasts', truncate=True, engine=engine)
 
     logger.info(f"✅ Wrote {len(forecast_df)} forecasts to database")
 
 
+# zstd-compressed Parquet copy of the forecasts table, next to the saved model
+FORECASTS_PARQUET = project_root / 'models' / 'saved' / 'latest_forecasts.parquet'
+
+
+def write_forecasts_to_parquet(forecast_df, path=FORECASTS_PARQUET):
+    """
+    Write forecasts to a Parquet snapshot
+
+    Same rows and columns as the forecasts table, so downstream consumers
+    can read the latest run without querying the database.
+    """
+    if pyarrow is None:
+        logger.info("   pyarrow not installed, skipping Parquet snapshot")
+        return None
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    forecast_df.to_parquet(path, engine='pyarrow', index=False, compression='zstd')
+    logger.info(f"✅ Wrote {len(forecast_df)} forecasts to {path}")
+    return path
+
+
 def main():
     logger.info("=" * 60)
     logger.info("FORECAST GENERATION PIPELINE")
@@ -259,7 +282,7 @@ def main():
 
     # 1. Database connection
     logger.info("\n[1/4] Connecting to database...")
-    engine = get_db_engine()
+    engine = db_manager.connect()
 
     # 2. Load model
     logger.info("\n[2/4] Loading trained model...")
@@ -278,6 +301,7 @@ def main():
     # 4. Write to database
     logger.info("\n[4/4] Writing forecasts to database...")
     write_forecasts(forecast_df, engine)
+    write_forecasts_to_parquet(forecast_df)
 
     # Summary
     logger.info("\n" + "=" * 60)
@@ -5,11 +5,10 @@ Loads data, trains LightGBM model, saves to disk and MLflow
 import os
 import sys
 import logging
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
-from sqlalchemy import create_engine
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
@@ -25,28 +24,42 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 from models.trainer import WalmartForecaster
+from database.db_manager import db_manager
+from data_pipeline.feature_engineering import ENGINEERED_DTYPES
 
 
-def get_db_engine():
-    """Create database engine with URL-encoded password"""
-    password = quote_plus(os.getenv('DB_PASSWORD'))
-    return create_engine(
-        f"postgresql://{os.getenv('DB_USER')}:{password}"
-        f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-    )
+# Numeric feature columns; NULLs are filled with 0 in the training query
+FILL_ZERO_COLS = [c for c in ENGINEERED_DTYPES if c not in ('store_id', 'dept_id')] + [
+    'week_of_year', 'month', 'quarter', 'markdown_count'
+]
+LAG_COLS = [c for c in FILL_ZERO_COLS if 'lag' in c or 'rolling' in c]
+PASSTHROUGH_COLS = [
+    'store_id', 'dept_id', 'feature_date', 'weekly_sales',
+    'is_month_start', 'is_month_end', 'is_holiday', 'has_markdown',
+    'store_type_a', 'store_type_b', 'store_type_c'
+]
 
 
 def load_training_data(engine):
-    """Load engineered features from database"""
+    """
+    Load engineered features from database
+
+    Cleaning happens in the query: rows with a null target, or with no lag
+    or rolling history at all (the first weeks of each store-dept), are
+    filtered out, and remaining NULL numeric features come back as 0.
+    """
     logger.info("Loading training data from database...")
 
-    query = """
-        SELECT *
+    columns = PASSTHROUGH_COLS + [f"COALESCE({c}, 0) AS {c}" for c in FILL_ZERO_COLS]
+    query = f"""
+        SELECT {', '.join(columns)}
         FROM engineered_features
+        WHERE weekly_sales IS NOT NULL
+          AND COALESCE({', '.join(LAG_COLS)}) IS NOT NULL
         ORDER BY store_id, dept_id, feature_date
     """
 
-    df = pd.read_sql(query, engine)
+    df = db_manager.read_dataframe(query, dtype=ENGINEERED_DTYPES, engine=engine)
     logger.info(f"✅ Loaded {len(df):,} rows, {len(df.columns)} columns")
     logger.info(f"   Date range: {df['feature_date'].min()} to {df['feature_date'].max()}")
     logger.info(f"   Stores: {df['store_id'].nunique()}, Departments: {df['dept_id'].nunique()}")
@@ -55,29 +68,19 @@ def load_training_data(engine):
 
 
 def clean_data(df):
-    """Remove rows with null targets and key lag features"""
-    logger.info("Cleaning data...")
-
-    initial = len(df)
-
-    # Drop rows where target is null
-    df = df.dropna(subset=['weekly_sales'])
-
-    # Drop rows where critical lag features are null
-    # (these are the first few weeks per store-dept with no history)
-    lag_cols = [c for c in df.columns if 'lag' in c or 'rolling' in c]
-    df = df.dropna(subset=lag_cols, how='all')
+    """
+    Prepare loaded features for LightGBM
 
-    # Fill remaining NaN in numeric columns with 0
-    numeric_cols = df.select_dtypes(include=['float64', 'float32', 'int64', 'int32']).columns
-    df[numeric_cols] = df[numeric_cols].fillna(0)
+    Null filtering and filling is done by the load_training_data query.
+    """
+    logger.info("Cleaning data...")
 
-    # Convert boolean columns to int for LightGBM
+    # Convert boolean columns to int8 for LightGBM in one cast
     bool_cols = df.select_dtypes(include=['bool']).columns
-    for col in bool_cols:
-        df[col] = df[col].astype(int)
+    if len(bool_cols):
+        df[bool_cols] = df[bool_cols].astype(np.int8)
 
-    logger.info(f"✅ Cleaned: {initial:,} → {len(df):,} rows ({initial - len(df):,} removed)")
+    logger.info(f"✅ Cleaned: {len(bool_cols)} boolean columns cast to int8")
 
     return df
 
@@ -89,7 +92,7 @@ def main():
 
     # 1. Connect to database
     logger.info("\n[1/5] Connecting to database...")
-    engine = get_db_engine()
+    engine = db_manager.connect()
 
     # 2. Load data
     logger.info("\n[2/5] Loading training data...")
@@ -2,6 +2,7 @@
 LightGBM Model Trainer with MLflow Tracking
 Handles model training, evaluation, and persistence
 """
+import copy
 import os
 import numpy as np
 import pandas as pd
@@ -9,15 +10,55 @@ import lightgbm as lgb
 import mlflow
 import mlflow.lightgbm
 from datetime import datetime
+from functools import lru_cache
+import json
 import logging
+import tempfile
 import yaml
 from pathlib import Path
+from sqlalchemy import column, table
 
 from models.metrics import calculate_wmae, evaluate_model, wmae_lgb_metric
 from database.db_manager import db_manager
 
 logger = logging.getLogger(__name__)
 
+try:
+    # Optional: faster JSON encoding of the metadata payloads
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Optional: feature importance artifact as Parquet instead of CSV
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Lightweight table construct for inserts; no reflection round-trip needed
+MODEL_METADATA = table(
+    'model_metadata',
+    column('run_id'), column('model_name'), column('model_version'),
+    column('wmae'), column('mae'), column('rmse'), column('training_date'),
+    column('parameters'), column('feature_importance')
+)
+
+
+@lru_cache(maxsize=8)
+def _load_config(path):
+    """Parse a YAML config file, cached per resolved path"""
+    # libyaml's C loader when PyYAML was built with it
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=loader)
+
+
+def _dumps(obj):
+    """Serialize obj to a JSON string"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
 
 class WalmartForecaster:
     """
@@ -31,9 +72,8 @@ class WalmartForecaster:
         Args:
             config_path: Path to configuration file
         """
-        # Load configuration
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        # Load configuration (parsed once per file; each instance gets its own copy)
+        self.config = copy.deepcopy(_load_config(str(Path(config_path).resolve())))
         
         self.model_config = self.config['model']
         self.mlflow_config = self.config['mlflow']
@@ -41,6 +81,7 @@ class WalmartForecaster:
         # Model attributes
         self.model = None
         self.feature_names = None
+        self.categorical_features = []
         self.feature_importance = None
         
         # MLflow setup
@@ -62,19 +103,31 @@ class WalmartForecaster:
         Returns:
             tuple: (X, y, is_holiday)
         """
+        # Identifier columns listed under model.categorical_features are kept
+        # as native LightGBM categoricals instead of being dropped
+        categorical = self.model_config.get('categorical_features') or []
+        
         if exclude_cols is None:
-            exclude_cols = ['id', 'store_id', 'dept_id', 'feature_date', 
-                          'weekly_sales', 'created_at']
+            exclude_cols = [col for col in ['id', 'store_id', 'dept_id', 'feature_date',
+                                            'weekly_sales', 'created_at']
+                            if col not in categorical]
         
         # Separate features and target
         feature_cols = [col for col in df.columns if col not in exclude_cols]
         
-        X = df[feature_cols].copy()
+        # Fill one column-major float32 matrix column by column, instead of
+        # copying the selection and then casting it; X is a single block
+        # that train() hands to LightGBM without another copy
+        values = np.empty((len(df), len(feature_cols)), dtype=np.float32, order='F')
+        for j, col in enumerate(feature_cols):
+            values[:, j] = df[col].to_numpy()
+        X = pd.DataFrame(values, columns=feature_cols, index=df.index, copy=False)
         y = df[target_col].values
         is_holiday = df['is_holiday'].values if 'is_holiday' in df.columns else np.zeros(len(df), dtype=bool)
         
         # Store feature names
         self.feature_names = feature_cols
+        self.categorical_features = [col for col in categorical if col in feature_cols]
         
         logger.info(f"✓ Data prepared: {X.shape[0]} samples, {X.shape[1]} features")
         
@@ -99,9 +152,11 @@ class WalmartForecaster:
         # Calculate validation start date (val_weeks before max_date)
         val_start_date = max_date - pd.Timedelta(weeks=val_weeks)
         
-        # Split data
-        train_df = df[df['feature_date'] < val_start_date].copy()
-        val_df = df[df['feature_date'] >= val_start_date].copy()
+        # Split data at the first validation row; dates are sorted, so one
+        # binary search replaces two full-column comparisons and copies
+        split_idx = df['feature_date'].searchsorted(val_start_date, side='left')
+        train_df = df.iloc[:split_idx]
+        val_df = df.iloc[split_idx:]
         
         logger.info(f"✓ Train/Val split created:")
         logger.info(f"  Train: {len(train_df):,} samples ({train_df['feature_date'].min()} to {train_df['feature_date'].max()})")
@@ -130,29 +185,51 @@ class WalmartForecaster:
         if val_df is not None:
             X_val, y_val, is_holiday_val = self.prepare_data(val_df)
         
-        # Create LightGBM datasets
-        train_data = lgb.Dataset(X_train, label=y_train)
+        # Create LightGBM datasets from float32 matrices; with max_bin=255
+        # LightGBM stores every feature as uint8 bin codes, and
+        # free_raw_data drops the float copy once the bins are built
+        train_data = lgb.Dataset(
+            X_train.to_numpy(dtype=np.float32),
+            label=y_train,
+            feature_name=self.feature_names,
+            categorical_feature=self.categorical_features or 'auto',
+            params={'max_bin': 255},
+            free_raw_data=True
+        )
         
         valid_sets = [train_data]
         valid_names = ['train']
         
         if val_df is not None:
-            val_data = lgb.Dataset(X_val, label=y_val, reference=train_data)
+            val_data = lgb.Dataset(
+                X_val.to_numpy(dtype=np.float32),
+                label=y_val,
+                feature_name=self.feature_names,
+                categorical_feature=self.categorical_features or 'auto',
+                params={'max_bin': 255},
+                reference=train_data
+            )
             valid_sets.append(val_data)
             valid_names.append('valid')
         
+        # Use every core, and leave force_row_wise/force_col_wise unset so
+        # LightGBM benchmarks both histogram layouts and logs the one it picks
+        params = {**self.model_config['params']}
+        params.setdefault('num_threads', os.cpu_count())
+        params.setdefault('verbosity', 1)
+        
         # Start MLflow run
         with mlflow.start_run():
-            # Log parameters
-            mlflow.log_params(self.model_config['params'])
-            mlflow.log_param('train_samples', len(X_train))
+            # Log parameters (one batched call)
+            run_params = {**params, 'train_samples': len(X_train)}
             if val_df is not None:
-                mlflow.log_param('val_samples', len(X_val))
+                run_params['val_samples'] = len(X_val)
+            mlflow.log_params(run_params)
             
             # Train model
             logger.info("Training model...")
             self.model = lgb.train(
-                self.model_config['params'],
+                params,
                 train_data,
                 num_boost_round=self.model_config['num_boost_round'],
                 valid_sets=valid_sets,
@@ -166,21 +243,19 @@ class WalmartForecaster:
             logger.info(f"✓ Training complete. Best iteration: {self.model.best_iteration}")
             
             # Evaluate on training set
-            train_pred = self.model.predict(X_train)
+            train_pred = self.predict(X_train)
             train_metrics = evaluate_model(y_train, train_pred, is_holiday_train)
             
-            # Log training metrics
-            for metric_name, metric_value in train_metrics.items():
-                mlflow.log_metric(f'train_{metric_name}', metric_value)
+            run_metrics = {f'train_{name}': value for name, value in train_metrics.items()}
             
             # Evaluate on validation set
             if val_df is not None:
-                val_pred = self.model.predict(X_val)
+                val_pred = self.predict(X_val)
                 val_metrics = evaluate_model(y_val, val_pred, is_holiday_val)
-                
-                # Log validation metrics
-                for metric_name, metric_value in val_metrics.items():
-                    mlflow.log_metric(f'val_{metric_name}', metric_value)
+                run_metrics.update({f'val_{name}': value for name, value in val_metrics.items()})
+            
+            # Log training and validation metrics (one batched call)
+            mlflow.log_metrics(run_metrics)
             
             # Feature importance
             self.feature_importance = pd.DataFrame({
@@ -190,14 +265,22 @@ class WalmartForecaster:
             
             # Log top 20 features
             logger.info("\nTop 20 Most Important Features:")
-            for idx, row in self.feature_importance.head(20).iterrows():
-                logger.info(f"  {row['feature']}: {row['importance']:.2f}")
+            top = self.feature_importance.head(20)
+            logger.info("\n".join(
+                f"  {feature}: {importance:.2f}"
+                for feature, importance in zip(top['feature'].to_numpy(), top['importance'].to_numpy())
+            ))
             
-            # Save feature importance as artifact
-            importance_path = 'feature_importance.csv'
-            self.feature_importance.to_csv(importance_path, index=False)
-            mlflow.log_artifact(importance_path)
-            os.remove(importance_path)
+            # Save feature importance as artifact (typed Parquet when pyarrow
+            # is available), staged in a temp dir rather than the working dir
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                if pyarrow is not None:
+                    importance_path = os.path.join(tmp_dir, 'feature_importance.parquet')
+                    self.feature_importance.to_parquet(importance_path, index=False)
+                else:
+                    importance_path = os.path.join(tmp_dir, 'feature_importance.csv')
+                    self.feature_importance.to_csv(importance_path, index=False)
+                mlflow.log_artifact(importance_path)
             
             # Log model
             mlflow.lightgbm.log_model(
@@ -230,11 +313,9 @@ class WalmartForecaster:
             mae: MAE score
             rmse: RMSE score
         """
-        import json
-        
         engine = db_manager.connect()
         
-        metadata = pd.DataFrame([{
+        row = {
             'run_id': run_id,
             'model_name': 'lightgbm_forecaster',
             'model_version': 'v1.0',
@@ -242,11 +323,12 @@ class WalmartForecaster:
             'mae': mae,
             'rmse': rmse,
             'training_date': datetime.now(),
-            'parameters': json.dumps(self.model_config['params']),
-            'feature_importance': json.dumps(self.feature_importance.to_dict('records'))
-        }])
+            'parameters': _dumps(self.model_config['params']),
+            'feature_importance': _dumps(self.feature_importance.to_dict('records'))
+        }
         
-        metadata.to_sql('model_metadata', engine, if_exists='append', index=False)
+        with engine.begin() as conn:
+            conn.execute(MODEL_METADATA.insert(), [row])
         logger.info("✓ Model metadata saved to database")
     
     def predict(self, X):
@@ -262,7 +344,15 @@ class WalmartForecaster:
         if self.model is None:
             raise ValueError("Model not trained. Call train() first.")
         
-        return self.model.predict(X)
+        # Score with the early-stopped tree count on all cores; DataFrames
+        # go in as their float32 values so LightGBM skips its pandas path
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy(dtype=np.float32)
+        return self.model.predict(
+            X,
+            num_iteration=self.model.best_iteration or None,
+            num_threads=os.cpu_count()
+        )
     
     def save_model(self, path='models/saved/walmart_forecaster.txt'):
         """
@@ -4,19 +4,69 @@ Docker deployment automation script for Walmart Retail Forecasting System.
 """
 import os
 import sys
+import asyncio
+import collections
 import subprocess
 import argparse
 from pathlib import Path
 
 
-def run_command(cmd, check=True):
-    """Run shell command and return output."""
+def run_command(cmd, check=True, tail_lines=200):
+    """
+    Run shell command, streaming its output, and return the last lines.
+    
+    Output (stdout and stderr) is echoed line by line as it arrives, so
+    long builds and followed logs show progress and are never held in
+    memory whole; only the last tail_lines lines are kept and returned.
+    """
     print(f"Running: {cmd}")
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if check and result.returncode != 0:
-        print(f"Error: {result.stderr}")
+    tail = collections.deque(maxlen=tail_lines)
+    with subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, text=True, bufsize=1) as proc:
+        for line in proc.stdout:
+            sys.stdout.write(line)
+            tail.append(line)
+        returncode = proc.wait()
+    if check and returncode != 0:
+        print(f"Error: command exited with status {returncode}")
         sys.exit(1)
-    return result.stdout
+    return ''.join(tail)
+
+
+class CommandError(RuntimeError):
+    """A shell command run by run_command_async exited with non-zero status."""
+    
+    def __init__(self, cmd, returncode):
+        super().__init__(f"'{cmd}' exited with status {returncode}")
+        self.cmd = cmd
+        self.returncode = returncode
+
+
+async def run_command_async(cmd, check=True, tail_lines=200, label=None):
+    """
+    Run shell command without blocking the event loop, streaming its output.
+    
+    Like run_command, output is echoed line by line as it arrives and only
+    the last tail_lines lines are kept and returned. Lines are prefixed with
+    [label] so steps running concurrently can be told apart. A failing
+    command raises CommandError instead of exiting, so concurrent steps are
+    not cut off and the caller can report which one failed.
+    """
+    prefix = f"[{label}] " if label else ""
+    print(f"{prefix}Running: {cmd}")
+    tail = collections.deque(maxlen=tail_lines)
+    proc = await asyncio.create_subprocess_shell(
+        cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        limit=1024 * 1024
+    )
+    async for raw in proc.stdout:
+        line = raw.decode(errors='replace')
+        sys.stdout.write(prefix + line)
+        tail.append(line)
+    returncode = await proc.wait()
+    if check and returncode != 0:
+        raise CommandError(cmd, returncode)
+    return ''.join(tail)
 
 
 def check_docker():
@@ -79,43 +129,100 @@ def view_logs(service="app", follow=False):
     run_command(cmd, check=False)
 
 
-def push_to_dockerhub(username, tag="latest"):
-    """Push image to Docker Hub."""
-    print(f"\n[PUSH] Pushing to Docker Hub as {username}/walmart-forecasting:{tag}")
-    
-    # Login
+def docker_login():
+    """Log in to Docker Hub (may prompt for credentials)."""
     print("Logging in to Docker Hub...")
     run_command("docker login")
-    
+
+
+async def push_image_async(username, tag="latest"):
+    """Tag and push an already built image to Docker Hub."""
     # Tag image
     print(f"Tagging image...")
-    run_command(f"docker tag walmart-forecasting:{tag} {username}/walmart-forecasting:{tag}")
+    await run_command_async(f"docker tag walmart-forecasting:{tag} {username}/walmart-forecasting:{tag}",
+                            label="push")
     
     # Push
     print(f"Pushing image...")
-    run_command(f"docker push {username}/walmart-forecasting:{tag}")
+    await run_command_async(f"docker push {username}/walmart-forecasting:{tag}", label="push")
     
     print(f"[OK] Image pushed: {username}/walmart-forecasting:{tag}")
     print(f"\n[INFO] Pull with: docker pull {username}/walmart-forecasting:{tag}")
 
 
+def push_to_dockerhub(username, tag="latest"):
+    """Push image to Docker Hub."""
+    print(f"\n[PUSH] Pushing to Docker Hub as {username}/walmart-forecasting:{tag}")
+    
+    # Login
+    docker_login()
+    
+    try:
+        asyncio.run(push_image_async(username, tag))
+    except CommandError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
 def run_tests():
     """Run tests in Docker container."""
     print("\n[TEST] Running tests...")
     run_command("docker-compose exec app pytest tests/ -v", check=False)
 
 
-def initialize_data():
+async def initialize_data_async():
     """Initialize database and load data."""
     print("\n[INIT] Initializing database...")
-    run_command("docker-compose exec app python scripts/setup_database.py")
+    await run_command_async("docker-compose exec -T app python scripts/setup_database.py", label="init")
     
+    # The loader needs the schema, so it runs after setup completes
     print("\n[DATA] Loading data...")
-    run_command("docker-compose exec app python data_pipeline/data_loader.py")
+    await run_command_async("docker-compose exec -T app python data_pipeline/data_loader.py", label="init")
     
     print("[OK] Data initialized")
 
 
+def initialize_data():
+    """Initialize database and load data."""
+    try:
+        asyncio.run(initialize_data_async())
+    except CommandError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+async def finish_deploy(username=None, tag="latest"):
+    """
+    Wait for services and load data while the image is pushed.
+    
+    Pushing only needs the built image, so it overlaps the readiness wait
+    and data initialization instead of running after them. A failing step
+    does not cancel the other; each is allowed to finish first.
+    
+    Returns:
+        True if every step succeeded
+    """
+    async def wait_and_initialize():
+        print("\n[WAIT] Waiting for services to be ready...")
+        await asyncio.sleep(10)
+        await initialize_data_async()
+    
+    steps = {"data initialization": wait_and_initialize()}
+    if username:
+        print(f"\n[PUSH] Pushing to Docker Hub as {username}/walmart-forecasting:{tag}")
+        steps["image push"] = push_image_async(username, tag)
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    
+    ok = True
+    for step, result in zip(steps, results):
+        if isinstance(result, CommandError):
+            print(f"[ERROR] {step} failed: {result}")
+            ok = False
+        elif isinstance(result, BaseException):
+            raise result
+    return ok
+
+
 def main():
     parser = argparse.ArgumentParser(description="Docker deployment automation")
     parser.add_argument("command", choices=[
@@ -181,21 +288,19 @@ def main():
         if not check_docker() or not check_env_file():
             return
         
+        # Log in up front: it may prompt, and the push later runs concurrently
+        if args.username:
+            docker_login()
+        
         build_image(args.tag)
         start_services()
         
-        print("\n[WAIT] Waiting for services to be ready...")
-        import time
-        time.sleep(10)
-        
-        initialize_data()
+        if not asyncio.run(finish_deploy(args.username, args.tag)):
+            sys.exit(1)
         
         print("\n[OK] Full deployment complete!")
         print("\n[INFO] Access dashboard at: http://localhost:8501")
         print("[INFO] Access MLflow at: http://localhost:5000")
-        
-        if args.username:
-            push_to_dockerhub(args.username, args.tag)
 
 
 if __name__ == "__main__":
@@ -24,28 +24,36 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def load_sample_data():
+# Store/department the agents are exercised on
+TEST_STORE_ID = 1
+TEST_DEPT_ID = 1
+
+
+def load_sample_data(store_id=TEST_STORE_ID, dept_id=TEST_DEPT_ID):
     """Load sample data for testing"""
     logger.info("Loading sample data from database...")
     
-    engine = db_manager.connect()
-    
-    # Load recent historical sales
-    historical_sales = pd.read_sql("""
+    # Load recent historical sales for the tested store/department only,
+    # streamed through a server-side cursor
+    historical_sales = db_manager.read_dataframe("""
         SELECT *
         FROM engineered_features
         WHERE feature_date >= '2012-09-01'
+          AND store_id = :store_id
+          AND dept_id = :dept_id
         ORDER BY feature_date DESC
         LIMIT 1000
-    """, engine)
+    """, params={'store_id': store_id, 'dept_id': dept_id}, chunk_size=250)
     
     logger.info(f"✓ Loaded {len(historical_sales)} historical sales records")
     
     # Create sample forecasts (using recent data as proxy)
-    forecasts = historical_sales.copy()
-    forecasts['forecast_date'] = forecasts['feature_date']
-    forecasts['predicted_sales'] = forecasts['weekly_sales'] * 1.05  # 5% growth assumption
-    forecasts = forecasts[['store_id', 'dept_id', 'forecast_date', 'predicted_sales']]
+    forecasts = pd.DataFrame({
+        'store_id': historical_sales['store_id'].to_numpy(),
+        'dept_id': historical_sales['dept_id'].to_numpy(),
+        'forecast_date': historical_sales['feature_date'].to_numpy(),
+        'predicted_sales': historical_sales['weekly_sales'].to_numpy() * 1.05  # 5% growth assumption
+    })
     
     logger.info(f"✓ Created {len(forecasts)} sample forecasts")
     
@@ -65,7 +73,7 @@ def main():
         
         # Step 2: Initialize orchestrator
         logger.info("\n[2/3] Initializing Agent Orchestrator...")
-        orchestrator = AgentOrchestrator()
+        orchestrator = AgentOrchestrator(escape_dollars=False)  # console output, not Streamlit
         
         # Step 3: Run comprehensive analysis
         logger.info("\n[3/3] Running comprehensive analysis...")
@@ -75,8 +83,8 @@ def main():
         results = orchestrator.analyze_forecast(
             forecasts=forecasts,
             historical_sales=historical_sales,
-            store_id=1,
-            dept_id=1
+            store_id=TEST_STORE_ID,
+            dept_id=TEST_DEPT_ID
         )
         
         # Display results
@@ -4,20 +4,42 @@ Unit tests for AI agents functionality.
 import pytest
 import pandas as pd
 import numpy as np
+import asyncio
 from unittest.mock import Mock, patch, MagicMock
 
 
+class _LoopBoundAsync:
+    """Stand-in for generate_content_async: fails once its first event loop is gone."""
+
+    def __init__(self, response):
+        self.response = response
+        self.loop = None
+
+    async def __call__(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError("Event loop is closed")
+        return self.response
+
+
 # ── Patch Gemini globally so agents can be instantiated without a real API key ──
 
 @pytest.fixture(autouse=True)
 def mock_gemini(monkeypatch):
     """Mock Google Generative AI for all tests."""
     monkeypatch.setenv("GOOGLE_API_KEY", "fake-key-for-testing")
+    # Start every test with an empty shared-model cache
+    monkeypatch.setattr("agents.base_agent._MODEL_CACHE", {})
+    monkeypatch.setattr("agents.base_agent._configured_api_key", None)
     with patch("agents.base_agent.genai") as mock_genai:
         mock_model = MagicMock()
         mock_response = MagicMock()
         mock_response.text = "Mocked AI response for testing."
         mock_model.generate_content.return_value = mock_response
+        # The SDK's async client is bound to the first event loop that uses it
+        mock_model.generate_content_async = _LoopBoundAsync(mock_response)
         mock_genai.GenerativeModel.return_value = mock_model
         yield mock_genai
 
@@ -115,6 +137,35 @@ class TestBaseAgent:
         agent = DemandForecastingAgent()
         assert agent.get_history() == []
 
+    def test_generate_response_downsizes_headings(self, mock_gemini):
+        from agents.demand_agent import DemandForecastingAgent
+        agent = DemandForecastingAgent()
+        agent.model.generate_content.return_value = MagicMock(
+            text="# Title\n## Section\n### Detail\nCost $10"
+        )
+        text = agent.generate_response("Test prompt")
+        assert text == "### Title\n#### Section\n### Detail\nCost \\$10"
+
+    def test_generate_response_without_dollar_escaping(self, mock_gemini):
+        from agents.demand_agent import DemandForecastingAgent
+        agent = DemandForecastingAgent()
+        agent.escape_dollars = False
+        agent.model.generate_content.return_value = MagicMock(text="Cost $10")
+        assert agent.generate_response("Test prompt") == "Cost $10"
+
+    def test_agents_share_one_model(self, mock_gemini):
+        from agents.demand_agent import DemandForecastingAgent
+        from agents.anomaly_agent import AnomalyDetectionAgent
+        first, second = DemandForecastingAgent(), AnomalyDetectionAgent()
+        assert first.model is second.model
+        mock_gemini.GenerativeModel.assert_called_once_with("gemini-2.5-flash")
+        mock_gemini.configure.assert_called_once()
+
+    def test_date_stats_matches_series_reductions(self, sample_forecasts):
+        from agents.base_agent import date_stats
+        dates = sample_forecasts["forecast_date"]
+        assert date_stats(dates) == (dates.min(), dates.max(), dates.nunique())
+
     def test_missing_api_key_raises(self, monkeypatch):
         """Agent raises ValueError when GOOGLE_API_KEY is missing."""
         monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
@@ -186,6 +237,38 @@ class TestDemandForecastingAgent:
         assert len(agent.conversation_history) == 1
         assert agent.conversation_history[0]["prompt"] == "Test prompt"
 
+    def test_aprocess_matches_process(self, sample_forecasts, sample_historical_sales):
+        from agents.demand_agent import DemandForecastingAgent
+        agent = DemandForecastingAgent()
+        context = {
+            "forecasts": sample_forecasts,
+            "historical_sales": sample_historical_sales,
+        }
+        result = asyncio.run(agent.aprocess(context))
+        assert result["agent"] == "Demand Forecasting Agent"
+        assert result["response"] == agent.process(context)["response"]
+        assert agent.model.generate_content.call_count == 2
+
+    def test_float32_sales_keep_cent_accurate_totals(self, sample_forecasts):
+        from agents.demand_agent import DemandForecastingAgent
+        agent = DemandForecastingAgent()
+        downcast = sample_forecasts.astype({"predicted_sales": "float32"})
+        summary = agent._build_analysis_context(downcast, None, {})["forecast_summary"]
+        expected = downcast["predicted_sales"].to_numpy().astype(np.float64).sum()
+        assert summary["total_predicted_weekly_sales"] == f"${expected:,.2f}"
+
+    def test_analyze_forecast_accuracy_metrics(self, sample_historical_sales):
+        from agents.demand_agent import DemandForecastingAgent
+        agent = DemandForecastingAgent()
+        predicted = sample_historical_sales[["store_id", "dept_id", "feature_date"]].copy()
+        predicted["predicted_sales"] = sample_historical_sales["weekly_sales"] * 1.1
+        with patch.object(agent, "process", side_effect=lambda ctx: ctx) as mock_process:
+            context = agent.analyze_forecast_accuracy(sample_historical_sales, predicted)
+        mock_process.assert_called_once()
+        assert context["accuracy_metrics"]["mape"] == "10.00%"
+        expected_mae = (sample_historical_sales["weekly_sales"] * 0.1).mean()
+        assert context["accuracy_metrics"]["mae"] == f"${expected_mae:,.2f}"
+
 
 # ── InventoryOptimizationAgent Tests ────────────────────────
 
@@ -226,6 +309,14 @@ class TestInventoryOptimizationAgent:
         assert "response" in result
         assert isinstance(result["response"], str)
 
+    def test_store_demand_stats_match_groupby(self, sample_forecasts):
+        from agents.inventory_agent import InventoryOptimizationAgent
+        store_mean, store_std, total = InventoryOptimizationAgent._store_demand_stats(sample_forecasts)
+        expected = sample_forecasts.groupby("store_id")["predicted_sales"].agg(["mean", "std", "sum"])
+        assert np.nanmean(store_mean) == pytest.approx(expected["mean"].mean())
+        assert np.nanmean(store_std) == pytest.approx(expected["std"].mean())
+        assert total == pytest.approx(expected["sum"].sum())
+
     def test_summarize_context_with_service_level(self):
         from agents.inventory_agent import InventoryOptimizationAgent
         agent = InventoryOptimizationAgent()
@@ -275,6 +366,49 @@ class TestAnomalyDetectionAgent:
         # Our fixture has 2 clear outliers (200k, 250k)
         assert result["anomalies_detected"] >= 2
 
+    def test_detect_anomalies_keeps_largest_outliers(self, sample_sales_data):
+        from agents.anomaly_agent import AnomalyDetectionAgent
+        agent = AnomalyDetectionAgent()
+        context = agent._anomaly_context(sample_sales_data, threshold=0.5)
+        assert len(context["anomalies"]) == 20
+        sales = {a["sales"] for a in context["anomalies"]}
+        assert {"$200,000.00", "$250,000.00"} <= sales
+        z_scores = [float(a["z_score"]) for a in context["anomalies"]]
+        assert z_scores == sorted(z_scores, reverse=True)
+        assert context["anomalies"][0]["sales"] == "$250,000.00"
+
+    def test_anomaly_statistics_are_cached(self, sample_sales_data):
+        from agents.anomaly_agent import AnomalyDetectionAgent
+        agent = AnomalyDetectionAgent()
+        slice_key = (1, 1, "2023-01-06", "2023-12-29")
+        first = agent._score_anomalies(sample_sales_data, 3.0, slice_key=slice_key)
+        with patch("agents.anomaly_agent.np.nanstd") as mock_std, \
+                patch("agents.anomaly_agent.pd.util.hash_pandas_object") as mock_hash:
+            second = agent._score_anomalies(sample_sales_data.copy(), 3.0, slice_key=slice_key)
+            mock_std.assert_not_called()
+            mock_hash.assert_not_called()
+        assert first == second
+        assert len(agent._anomaly_cache) == 1
+
+        agent._score_anomalies(sample_sales_data, 2.0, slice_key=slice_key)
+        assert len(agent._anomaly_cache) == 2
+
+        # Without a slice identity the data is scored directly and not cached
+        agent._score_anomalies(sample_sales_data, 3.0)
+        assert len(agent._anomaly_cache) == 2
+
+    def test_anomaly_details_serialized_once_per_context(self, sample_sales_data):
+        import json
+        from agents.anomaly_agent import AnomalyDetectionAgent
+        agent = AnomalyDetectionAgent()
+        context = agent._anomaly_context(sample_sales_data, threshold=0.5)
+        first = agent._build_anomaly_context(sample_sales_data, context["anomalies"], context)
+        assert json.loads(first["anomaly_details"]) == context["anomalies"][:10]
+        with patch("agents.anomaly_agent.json.dumps") as mock_dumps:
+            second = agent._build_anomaly_context(sample_sales_data, context["anomalies"], context)
+            mock_dumps.assert_not_called()
+        assert second["anomaly_details"] == first["anomaly_details"]
+
     def test_process_without_anomalies(self, sample_sales_data):
         from agents.anomaly_agent import AnomalyDetectionAgent
         agent = AnomalyDetectionAgent()
@@ -321,4 +455,138 @@ class TestAgentIntegration:
         from agents.demand_agent import DemandForecastingAgent
         agent = DemandForecastingAgent()
         result = agent.process({})
-        assert "response" in result
\ No newline at end of file
+        assert "response" in result
+
+    def test_analyze_forecast_runs_agents_concurrently(self, sample_forecasts, sample_historical_sales):
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        results = orchestrator.analyze_forecast(
+            forecasts=sample_forecasts,
+            historical_sales=sample_historical_sales,
+            store_id=1,
+            dept_id=1,
+        )
+        insights = results["detailed_insights"]
+        assert set(insights) == {"demand_analysis", "inventory_recommendations", "anomaly_detection"}
+        for name in ("demand", "inventory", "anomaly"):
+            orchestrator.get_agent(name).model.generate_content.assert_called()
+        assert "MULTI-AGENT ANALYSIS SUMMARY" in results["summary"]
+
+    def test_analyze_forecast_twice_on_same_orchestrator(self, sample_forecasts, sample_historical_sales):
+        """Test that a second analysis works after asyncio.run closed the first loop."""
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        for _ in range(2):
+            results = orchestrator.analyze_forecast(sample_forecasts, sample_historical_sales)
+            for insight in results["detailed_insights"].values():
+                assert insight["response"] == "Mocked AI response for testing."
+
+    def test_shared_model_survives_across_orchestrators(self, mock_gemini, sample_forecasts,
+                                                        sample_historical_sales):
+        """Test that the cached model keeps working for orchestrators created later (new sessions)."""
+        from agents.orchestrator import AgentOrchestrator
+        first, second = AgentOrchestrator(), AgentOrchestrator()
+        assert first.get_agent("demand").model is second.get_agent("anomaly").model
+        mock_gemini.GenerativeModel.assert_called_once()
+
+        for orchestrator in (first, second, first):
+            results = orchestrator.analyze_forecast(sample_forecasts, sample_historical_sales)
+            for insight in results["detailed_insights"].values():
+                assert insight["response"] == "Mocked AI response for testing."
+
+    def test_batched_analyze_uses_single_call(self, sample_forecasts, sample_historical_sales):
+        import json
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        model = orchestrator.get_agent("demand").model
+        model.generate_content.reset_mock()
+        model.generate_content.return_value = MagicMock(text="```json\n" + json.dumps({
+            "demand": "# Demand outlook",
+            "inventory": "Hold $5,000 of stock",
+            "anomaly": "No major anomalies",
+        }) + "\n```")
+
+        results = orchestrator.analyze_forecast(
+            sample_forecasts, sample_historical_sales, batched=True
+        )
+        model.generate_content.assert_called_once()
+        insights = results["detailed_insights"]
+        assert insights["demand_analysis"]["response"] == "### Demand outlook"
+        assert insights["inventory_recommendations"]["response"] == "Hold \\$5,000 of stock"
+        assert "anomalies_detected" in insights["anomaly_detection"]
+
+    def test_batched_analyze_falls_back_on_bad_json(self, sample_forecasts, sample_historical_sales):
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        model = orchestrator.get_agent("demand").model
+        model.generate_content.side_effect = [MagicMock(text="not json")] + [model.generate_content.return_value] * 3
+
+        results = orchestrator.analyze_forecast(
+            sample_forecasts, sample_historical_sales, batched=True
+        )
+        assert model.generate_content.call_count == 4
+        assert results["detailed_insights"]["demand_analysis"]["response"] == "Mocked AI response for testing."
+
+    def test_batched_fallback_after_earlier_analysis(self, sample_forecasts, sample_historical_sales):
+        """Test that the per-agent fallback still works once a previous analysis closed its loop."""
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        orchestrator.analyze_forecast(sample_forecasts, sample_historical_sales)
+        model = orchestrator.get_agent("demand").model
+        model.generate_content.side_effect = [MagicMock(text="not json")] + [model.generate_content.return_value] * 3
+
+        results = orchestrator.analyze_forecast(sample_forecasts, sample_historical_sales, batched=True)
+        for insight in results["detailed_insights"].values():
+            assert insight["response"] == "Mocked AI response for testing."
+
+    def test_iter_analyze_forecast_yields_partial_results(self, sample_forecasts, sample_historical_sales):
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        partials = list(orchestrator.iter_analyze_forecast(sample_forecasts, sample_historical_sales))
+        assert 1 <= len(partials) <= 3
+        sizes = [len(p["detailed_insights"]) for p in partials]
+        assert sizes == sorted(sizes)
+        assert set(partials[-1]["detailed_insights"]) == {
+            "demand_analysis", "inventory_recommendations", "anomaly_detection"
+        }
+
+    def test_iter_and_analyze_forecast_can_be_mixed(self, sample_forecasts, sample_historical_sales):
+        """Test that streaming and blocking analyses share an orchestrator across loops."""
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        for _ in range(2):
+            streamed = list(orchestrator.iter_analyze_forecast(sample_forecasts, sample_historical_sales))
+            blocking = orchestrator.analyze_forecast(sample_forecasts, sample_historical_sales)
+            for results in (streamed[-1], blocking):
+                for insight in results["detailed_insights"].values():
+                    assert insight["response"] == "Mocked AI response for testing."
+
+    def test_precomputed_stats_match_agent_reductions(self, sample_forecasts, sample_historical_sales):
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        contexts = orchestrator._build_agent_contexts(sample_forecasts, sample_historical_sales, None, None)
+        precomputed = contexts["demand"]["precomputed"]
+        assert contexts["inventory"]["precomputed"] is precomputed
+        assert contexts["anomaly"]["precomputed"] is precomputed
+        assert precomputed["f_sum"] == pytest.approx(sample_forecasts["predicted_sales"].sum())
+        assert precomputed["h_std"] == pytest.approx(sample_historical_sales["weekly_sales"].std(), rel=1e-5)
+
+        demand = orchestrator.get_agent("demand")
+        shared = demand._build_analysis_context(sample_forecasts, sample_historical_sales, contexts["demand"])
+        own = demand._build_analysis_context(sample_forecasts, sample_historical_sales, {})
+        assert shared == own
+
+    def test_categorical_ids_give_same_contexts(self, sample_forecasts, sample_historical_sales):
+        from agents.orchestrator import AgentOrchestrator
+        orchestrator = AgentOrchestrator()
+        cat_forecasts = sample_forecasts.astype({"store_id": "category", "dept_id": "category"})
+        cat_history = sample_historical_sales.astype({"store_id": "category", "dept_id": "category"})
+
+        plain = orchestrator._build_agent_contexts(sample_forecasts, sample_historical_sales, 1, 2)
+        cat = orchestrator._build_agent_contexts(cat_forecasts, cat_history, 1, 2)
+        assert len(cat["demand"]["forecasts"]) == len(plain["demand"]["forecasts"]) == 8
+        assert len(orchestrator._filter_scope(cat_forecasts, 99, None)) == 0
+
+        demand = orchestrator.get_agent("demand")
+        assert (demand._build_analysis_context(cat_forecasts, cat_history, {})
+                == demand._build_analysis_context(sample_forecasts, sample_historical_sales, {}))
@@ -0,0 +1,40 @@
+"""
+Unit tests for dashboard chart helpers.
+"""
+import numpy as np
+import pandas as pd
+
+from dashboard._charts import lttb_indices, downsample
+
+
+class TestDownsample:
+    """Test LTTB downsampling of line series."""
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        """Test that LTTB keeps the first/last points and a lone spike."""
+        x = np.arange(1000, dtype=np.float64)
+        y = np.zeros(1000)
+        y[500] = 100.0
+        idx = lttb_indices(x, y, 50)
+        assert len(idx) == 50
+        assert idx[0] == 0 and idx[-1] == 999
+        assert 500 in idx
+        assert np.all(np.diff(idx) > 0)
+
+    def test_small_frame_is_unchanged(self):
+        """Test that frames under the point budget are returned as-is."""
+        df = pd.DataFrame({
+            "feature_date": pd.date_range("2012-01-06", periods=10, freq="W-FRI"),
+            "weekly_sales": np.arange(10.0),
+        })
+        assert downsample(df, "feature_date", "weekly_sales") is df
+
+    def test_datetime_series(self):
+        """Test downsampling on a datetime x axis."""
+        df = pd.DataFrame({
+            "feature_date": pd.date_range("2000-01-07", periods=5000, freq="D"),
+            "weekly_sales": np.sin(np.arange(5000) / 50.0),
+        })
+        out = downsample(df, "feature_date", "weekly_sales", n_out=300)
+        assert len(out) == 300
+        assert out["feature_date"].is_monotonic_increasing
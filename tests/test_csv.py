@@ -0,0 +1,79 @@
+"""
+Unit tests for dashboard CSV export.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+import dashboard._csv as csv_module
+from dashboard._csv import csv_bytes
+
+
+def _pandas_csv(df, monkeypatch):
+    """CSV bytes from the pandas fallback path."""
+    with monkeypatch.context() as m:
+        m.setattr(csv_module, "pa", None)
+        return csv_bytes(df)
+
+
+@pytest.fixture
+def forecast_frame():
+    """Forecast-shaped frame with a date column and mixed value types."""
+    return pd.DataFrame({
+        "forecast_date": pd.to_datetime(["2012-11-02", "2012-11-09", None]),
+        "store_id": np.array([1, 2, 3], dtype="int16"),
+        "predicted_sales": [1234.5, 1.0, np.nan],
+        "confidence": np.array([0.85, 0.83, 1e-5], dtype="float32"),
+        "model_version": ["v1.0", "v1 beta", None],
+        "is_holiday": [True, False, True],
+        "updated_at": pd.to_datetime(["2012-11-02 10:00:00", "2012-11-02 10:00:01", None]),
+        "week_start": [datetime.date(2012, 10, 27), None, datetime.date(2012, 11, 10)],
+    })
+
+
+class TestCsvBytes:
+    """Test that the Arrow writer produces the same bytes as DataFrame.to_csv."""
+
+    def test_arrow_path_matches_pandas(self, forecast_frame, monkeypatch):
+        """Test byte-for-byte parity, with plain YYYY-MM-DD dates and minimal quoting."""
+        pytest.importorskip("pyarrow")
+        with patch.object(pd.DataFrame, "to_csv", side_effect=AssertionError("pandas writer used")):
+            arrow = csv_bytes(forecast_frame)
+        expected = forecast_frame.to_csv(index=False, lineterminator="\n").encode()
+        assert arrow == expected == _pandas_csv(forecast_frame, monkeypatch)
+        assert arrow.splitlines()[1] == (
+            b"2012-11-02,1,1234.5,0.85,v1.0,True,2012-11-02 10:00:00,2012-10-27"
+        )
+
+    def test_fields_needing_quotes_fall_back_to_pandas(self, forecast_frame, monkeypatch):
+        """Test that strings with commas or quotes are quoted as pandas does."""
+        pytest.importorskip("pyarrow")
+        forecast_frame.loc[1, "model_version"] = 'v1, "beta"'
+        out = csv_bytes(forecast_frame)
+        assert out == _pandas_csv(forecast_frame, monkeypatch)
+        assert b'"v1, ""beta"""' in out
+
+    def test_arrow_backed_dates_export_as_plain_dates(self, monkeypatch):
+        """Test that read_frame's Arrow-backed DATE columns export like the NumPy backend's."""
+        pa = pytest.importorskip("pyarrow")
+        numpy_backend = pd.DataFrame({
+            "forecast_date": [datetime.date(2012, 11, 2), datetime.date(2012, 11, 9)],
+            "store_id": [1, 2],
+            "predicted_sales": [1234.5, 1.0],
+            "model_version": ["v1.0", None],
+        })
+        arrow_backend = pd.DataFrame({
+            "forecast_date": pd.Series(pd.to_datetime(["2012-11-02", "2012-11-09"])).astype(
+                "timestamp[ns][pyarrow]"),
+            "store_id": pd.Series([1, 2], dtype="int64[pyarrow]"),
+            "predicted_sales": pd.Series([1234.5, 1.0], dtype="double[pyarrow]"),
+            "model_version": pd.Series(["v1.0", None], dtype=pd.ArrowDtype(pa.string())),
+        })
+        expected = numpy_backend.to_csv(index=False, lineterminator="\n").encode()
+        with patch.object(pd.DataFrame, "to_csv", side_effect=AssertionError("pandas writer used")):
+            assert csv_bytes(arrow_backend) == expected
+        assert _pandas_csv(arrow_backend, monkeypatch) == expected
+        assert expected.splitlines()[1] == b"2012-11-02,1,1234.5,v1.0"
@@ -5,10 +5,12 @@ import pytest
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import data_pipeline.feature_engineering as feature_engineering
 from data_pipeline.feature_engineering import (
     create_temporal_features,
     create_lag_features,
     create_rolling_features,
+    create_series_features,
     create_economic_features,
     create_markdown_features,
     create_store_features,
@@ -87,6 +89,16 @@ class TestTemporalFeatures:
         assert result["month"].between(1, 12).all()
         assert result["quarter"].between(1, 4).all()
 
+    def test_matches_dt_accessors_at_year_edges(self):
+        """Test ISO weeks and month flags across year boundaries."""
+        df = pd.DataFrame({"date": pd.date_range("2020-12-25", "2025-01-10", freq="D")})
+        result = create_temporal_features(df)
+        dates = df["date"].dt
+        np.testing.assert_array_equal(result["week_of_year"], dates.isocalendar().week)
+        np.testing.assert_array_equal(result["quarter"], dates.quarter)
+        np.testing.assert_array_equal(result["is_month_start"], dates.is_month_start)
+        np.testing.assert_array_equal(result["is_month_end"], dates.is_month_end)
+
     def test_does_not_mutate_input(self, sample_sales_data):
         original_cols = list(sample_sales_data.columns)
         create_temporal_features(sample_sales_data)
@@ -109,6 +121,13 @@ class TestLagFeatures:
         first_rows = result.groupby(["store_id", "dept_id"]).nth(0)
         assert first_rows["sales_lag_1"].isna().all()
 
+    def test_lags_match_groupby_shift(self, sample_sales_data):
+        """Test lags against groupby.shift, including a lag longer than a group."""
+        result = create_lag_features(sample_sales_data, lags=[1, 52])
+        grouped = result.groupby(["store_id", "dept_id"])["weekly_sales"]
+        np.testing.assert_array_equal(result["sales_lag_1"], grouped.shift(1))
+        assert result["sales_lag_52"].isna().all()
+
     def test_does_not_mutate_input(self, sample_sales_data):
         original_cols = list(sample_sales_data.columns)
         create_lag_features(sample_sales_data, lags=[1])
@@ -137,6 +156,73 @@ class TestRollingFeatures:
         # Rolling mean should be within the range of weekly_sales
         assert result["rolling_mean_4"].min() >= sample_sales_data["weekly_sales"].min()
 
+    def test_rolling_matches_per_group_transform(self, sample_sales_data):
+        """Test that rolling stats line up with their own store/dept rows."""
+        shuffled = sample_sales_data.sample(frac=1, random_state=0)
+        result = create_rolling_features(shuffled, windows=[4])
+        expected = result.groupby(["store_id", "dept_id"])["weekly_sales"].transform(
+            lambda x: x.rolling(window=4, min_periods=1).std()
+        )
+        np.testing.assert_allclose(result["rolling_std_4"], expected)
+
+    def test_rolling_aligned_when_key_combos_are_sparse(self, sample_sales_data):
+        """Test alignment when a dept first appears after a later-numbered one."""
+        sparse = sample_sales_data[
+            ~((sample_sales_data["store_id"] == 1) & (sample_sales_data["dept_id"] == 1))
+        ]
+        result = create_rolling_features(sparse, windows=[4])
+        expected = result.groupby(["store_id", "dept_id"])["weekly_sales"].transform(
+            lambda x: x.rolling(window=4, min_periods=1).mean()
+        )
+        np.testing.assert_allclose(result["rolling_mean_4"], expected)
+
+    def test_kernel_matches_pandas_rolling(self, sample_sales_data, monkeypatch):
+        """Test the Numba kernel (run as plain Python) against the pandas path."""
+        sample_sales_data.loc[::7, "weekly_sales"] = np.nan
+        monkeypatch.setattr(feature_engineering, "_series_stats", None)
+        expected = create_rolling_features(sample_sales_data, windows=[4, 13])
+        monkeypatch.setattr(feature_engineering, "_series_stats",
+                            feature_engineering._series_stats_kernel)
+        result = create_rolling_features(sample_sales_data, windows=[4, 13])
+        pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+
+    def test_compiled_kernel_matches_pandas_rolling(self, sample_sales_data, monkeypatch):
+        """Test the compiled Numba kernel that production uses against the pandas path."""
+        pytest.importorskip("numba")
+        assert feature_engineering._series_stats is not None
+        sample_sales_data.loc[::7, "weekly_sales"] = np.nan
+        result = create_rolling_features(sample_sales_data, windows=[4, 13])
+        monkeypatch.setattr(feature_engineering, "_series_stats", None)
+        expected = create_rolling_features(sample_sales_data, windows=[4, 13])
+        pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+
+
+# ── Series (Lag + Rolling) Features ─────────────────────────
+
+class TestSeriesFeatures:
+    """Test create_series_features."""
+
+    def test_fused_kernel_matches_separate_stages(self, sample_sales_data, monkeypatch):
+        """Test the fused kernel (run as plain Python) against lag + rolling stages."""
+        shuffled = sample_sales_data.sample(frac=1, random_state=0)
+        monkeypatch.setattr(feature_engineering, "_series_stats", None)
+        expected = create_series_features(shuffled, lags=[1, 2, 52], windows=[4, 13])
+        monkeypatch.setattr(feature_engineering, "_series_stats",
+                            feature_engineering._series_stats_kernel)
+        result = create_series_features(shuffled, lags=[1, 2, 52], windows=[4, 13])
+        pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+
+    def test_compiled_kernel_matches_separate_stages(self, sample_sales_data, monkeypatch):
+        """Test the njit(parallel=True) kernel that production uses against lag + rolling stages."""
+        pytest.importorskip("numba")
+        assert feature_engineering._series_stats is not None
+        sample_sales_data.loc[::7, "weekly_sales"] = np.nan
+        shuffled = sample_sales_data.sample(frac=1, random_state=0)
+        result = create_series_features(shuffled, lags=[1, 2, 52], windows=[4, 13])
+        monkeypatch.setattr(feature_engineering, "_series_stats", None)
+        expected = create_series_features(shuffled, lags=[1, 2, 52], windows=[4, 13])
+        pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+
 
 # ── Economic Features ───────────────────────────────────────
 
@@ -179,6 +265,12 @@ class TestMarkdownFeatures:
         for col in md_cols:
             assert result[col].isna().sum() == 0
 
+    def test_does_not_mutate_input(self, sample_features_data):
+        n_missing = sample_features_data["markdown1"].isna().sum()
+        create_markdown_features(sample_features_data)
+        assert sample_features_data["markdown1"].isna().sum() == n_missing
+        assert "total_markdown" not in sample_features_data.columns
+
 
 # ── Store Features ──────────────────────────────────────────
 
@@ -79,6 +79,22 @@ class TestMetrics:
         # They happen to be equal here, so instead just verify the value is correct
         assert wmae_1 == pytest.approx(100.0)
 
+    def test_wmae_compiled_path_matches_numpy(self, monkeypatch):
+        """Test the Numba WMAE used for large inputs against the NumPy path."""
+        pytest.importorskip("numba")
+        import models.metrics as metrics
+        assert metrics._wmae_numba is not None
+
+        rng = np.random.default_rng(0)
+        n = metrics.WMAE_NUMBA_MIN_ROWS
+        y_true = rng.uniform(0, 50000, n).astype(np.float32)
+        y_pred = rng.uniform(0, 50000, n).astype(np.float32)
+        is_holiday = rng.random(n) < 0.1
+
+        compiled = calculate_wmae(y_true, y_pred, is_holiday)
+        monkeypatch.setattr(metrics, "_wmae_numba", None)
+        assert compiled == pytest.approx(calculate_wmae(y_true, y_pred, is_holiday), rel=1e-9)
+
 
 # ── WalmartForecaster Tests ─────────────────────────────────
 
@@ -152,6 +168,17 @@ class TestWalmartForecaster:
         assert fc.feature_names is not None
         assert len(fc.feature_names) > 0
 
+    def test_prepare_data_keeps_categorical_ids(self, sample_engineered_features):
+        """Ids listed in categorical_features stay in X as categoricals."""
+        fc = self._get_forecaster()
+        fc.model_config["categorical_features"] = ["store_id", "dept_id"]
+        X, _, _ = fc.prepare_data(sample_engineered_features)
+
+        assert "store_id" in X.columns and "dept_id" in X.columns
+        assert "feature_date" not in X.columns
+        assert fc.categorical_features == ["store_id", "dept_id"]
+        np.testing.assert_array_equal(X["dept_id"], sample_engineered_features["dept_id"])
+
     def test_create_train_val_split(self, sample_engineered_features):
         fc = self._get_forecaster()
         train_df, val_df = fc.create_train_val_split(sample_engineered_features, val_weeks=8)